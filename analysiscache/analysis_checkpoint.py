@@ -0,0 +1,77 @@
+import json
+import sqlite3
+from typing import Dict, List
+
+import numpy as np
+
+from katago import HumanProfile
+from katago.response import LazySuccessResponse, SuccessResponse
+
+
+class AnalysisCheckpoint:
+    # Every final response of one game is committed here as it arrives, keyed by turn, so that an interrupted analysis
+    # can be resumed by querying only what is missing.  The checkpoint is only trusted if it was written with the same
+    # settings; otherwise it is cleared.
+    def __init__(self, filename: str, settings: str):
+        self._filename: str = filename
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60.)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS settings (settings TEXT NOT NULL)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS searches (turn INTEGER PRIMARY KEY, response TEXT NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS human_policies ('
+            'turn INTEGER NOT NULL, '
+            'profile TEXT NOT NULL, '
+            'policy BLOB NOT NULL, '
+            'PRIMARY KEY (turn, profile))'
+        )
+
+        row = self._connection.execute('SELECT settings FROM settings').fetchone()
+        if row is None or row[0] != settings:
+            if row is not None:
+                print(f'{filename} was written with different settings; starting over.')
+            self._connection.execute('DELETE FROM settings')
+            self._connection.execute('DELETE FROM searches')
+            self._connection.execute('DELETE FROM human_policies')
+            self._connection.execute('INSERT INTO settings (settings) VALUES (?)', (settings,))
+        self._connection.commit()
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def searches(self) -> List[SuccessResponse]:
+        return [
+            LazySuccessResponse(json.loads(response))
+            for response, in self._connection.execute('SELECT response FROM searches ORDER BY turn')
+        ]
+
+    def human_policies(self) -> Dict[int, Dict[HumanProfile, np.ndarray]]:
+        turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]] = {}
+        for turn, profile, policy in self._connection.execute('SELECT turn, profile, policy FROM human_policies'):
+            turn_to_profile_to_policy.setdefault(turn, {})[HumanProfile(profile)] = np.frombuffer(
+                policy,
+                dtype=np.float64
+            )
+        return turn_to_profile_to_policy
+
+    def put_search(self, response: SuccessResponse):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO searches (turn, response) VALUES (?, ?)',
+            (response.turn_number, json.dumps(response.raw))
+        )
+        self._connection.commit()
+
+    def put_human_policy(self, turn: int, profile: HumanProfile, policy: np.ndarray):
+        self._connection.execute(
+            'INSERT OR REPLACE INTO human_policies (turn, profile, policy) VALUES (?, ?, ?)',
+            (turn, profile.value, np.asarray(policy, dtype=np.float64).tobytes())
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
@@ -0,0 +1,59 @@
+import sqlite3
+from typing import Optional
+
+import numpy as np
+
+from analysiscache.position_key import PositionKey, from_canonical, to_canonical
+from katago import HumanProfile
+
+
+class HumanPolicyCache:
+    # KataGo's symHash only arrives with a response, so positions are keyed by the domain's symmetry-canonical code
+    # instead; it is available before anything is queried and identifies the same equivalence class of boards.
+    def __init__(self, filename: str):
+        self._filename: str = filename
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60.)
+        # Concurrently analyzed games share the file, and every entry is committed as soon as it arrives.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS human_policies ('
+            'position TEXT NOT NULL, '
+            'rules TEXT NOT NULL, '
+            'komi REAL NOT NULL, '
+            'profile TEXT NOT NULL, '
+            'policy BLOB NOT NULL, '
+            'PRIMARY KEY (position, rules, komi, profile))'
+        )
+        self._connection.commit()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def get(self, key: PositionKey, rules: str, komi: float, profile: HumanProfile) -> Optional[np.ndarray]:
+        position, orientation = key
+        row = self._connection.execute(
+            'SELECT policy FROM human_policies WHERE position = ? AND rules = ? AND komi = ? AND profile = ?',
+            (position, rules, komi, profile.value)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return from_canonical(np.frombuffer(row[0], dtype=np.float64), orientation)
+
+    def put(self, key: PositionKey, rules: str, komi: float, profile: HumanProfile, policy: np.ndarray):
+        position, orientation = key
+        self._connection.execute(
+            'INSERT OR REPLACE INTO human_policies (position, rules, komi, profile, policy) VALUES (?, ?, ?, ?, ?)',
+            (position, rules, komi, profile.value, to_canonical(policy, orientation).tobytes())
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
@@ -0,0 +1,50 @@
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+from domain.coordinate import Coordinate
+from domain.game import Game
+from domain.orientation import Orientation
+from katago.query import Ruleset, RulesSpecification
+
+# Cached evaluations are stored in the canonical orientation of their position.  _PERMUTATIONS[o][i] is the index that
+# the intersection at index i moves to when the board is transformed by Orientation o; the pass stays at the end.
+_INTERSECTIONS = sorted(Coordinate, key=lambda c: c.index)
+_PERMUTATIONS: Dict[Orientation, np.ndarray] = {
+    o: np.asarray([o.transform(c).index for c in _INTERSECTIONS] + [len(_INTERSECTIONS)]) for o in Orientation
+}
+_TO_CANONICAL: Dict[Orientation, Dict[str, str]] = {
+    o: {'pass': 'pass', **{c.name: o.transform(c).name for c in _INTERSECTIONS}} for o in Orientation
+}
+_FROM_CANONICAL: Dict[Orientation, Dict[str, str]] = {
+    o: {v: k for k, v in labels.items()} for o, labels in _TO_CANONICAL.items()
+}
+
+PositionKey = Tuple[str, Orientation]
+
+
+def position_key(state: Game) -> PositionKey:
+    return state.canonical_code, state.canonical_orientation
+
+
+def rules_key(rules: Union[Ruleset, RulesSpecification]) -> str:
+    return str(rules) if isinstance(rules, Ruleset) else rules.to_json()
+
+
+def to_canonical(values: np.ndarray, orientation: Orientation) -> np.ndarray:
+    # Works for both policies (with the pass) and ownership (without it).
+    canonical = np.empty(len(values), dtype=np.float64)
+    canonical[_PERMUTATIONS[orientation][:len(values)]] = values
+    return canonical
+
+
+def from_canonical(values: np.ndarray, orientation: Orientation) -> np.ndarray:
+    return values[_PERMUTATIONS[orientation][:len(values)]]
+
+
+def label_to_canonical(label: str, orientation: Orientation) -> str:
+    return _TO_CANONICAL[orientation][label]
+
+
+def label_from_canonical(label: str, orientation: Orientation) -> str:
+    return _FROM_CANONICAL[orientation][label]
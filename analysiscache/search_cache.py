@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from analysiscache.position_key import (
+    PositionKey,
+    from_canonical,
+    label_from_canonical,
+    label_to_canonical,
+    to_canonical,
+)
+from katago.response import LazySuccessResponse
+
+# Only what the analysis reads from a deep search is kept.
+_ROOT_INFO_FIELDS = ('currentPlayer', 'scoreLead', 'visits', 'winrate')
+_MOVE_INFO_FIELDS = ('order', 'prior', 'scoreLead', 'visits', 'winrate')
+
+
+class SearchCache:
+    # Deep searches are keyed like HumanPolicyCache's policies, plus the model and the visit budget that produced them.
+    # The least recently used entries beyond its limit are evicted when the cache is closed.
+    def __init__(self, filename: str, limit: int):
+        self._filename: str = filename
+        self._limit: int = limit
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60.)
+        # Concurrently analyzed games share the file, and every entry is committed as soon as it arrives.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS searches ('
+            'position TEXT NOT NULL, '
+            'rules TEXT NOT NULL, '
+            'komi REAL NOT NULL, '
+            'model TEXT NOT NULL, '
+            'visits INTEGER NOT NULL, '
+            'root_info TEXT NOT NULL, '
+            'move_infos TEXT NOT NULL, '
+            'policy BLOB NOT NULL, '
+            'ownership BLOB NOT NULL, '
+            'used REAL NOT NULL, '
+            'PRIMARY KEY (position, rules, komi, model, visits))'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS searches_used ON searches (used)')
+        self._connection.commit()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def get(
+        self,
+        key: PositionKey,
+        rules: str,
+        komi: float,
+        model: str,
+        visits: int,
+        turn_number: int
+    ) -> Optional[LazySuccessResponse]:
+        position, orientation = key
+        identity = (position, rules, komi, model, visits)
+        row = self._connection.execute(
+            'SELECT root_info, move_infos, policy, ownership FROM searches '
+            'WHERE position = ? AND rules = ? AND komi = ? AND model = ? AND visits = ?',
+            identity
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._connection.execute(
+            'UPDATE searches SET used = ? '
+            'WHERE position = ? AND rules = ? AND komi = ? AND model = ? AND visits = ?',
+            (time.time(), *identity)
+        )
+        self._connection.commit()
+
+        root_info, move_infos, policy, ownership = row
+        move_infos = json.loads(move_infos)
+        for move_info in move_infos:
+            _orient_moves(move_info, lambda label: label_from_canonical(label, orientation))
+        return LazySuccessResponse({
+            'id': '',
+            'isDuringSearch': False,
+            'moveInfos': move_infos,
+            'ownership': from_canonical(np.frombuffer(ownership, dtype=np.float64), orientation).tolist(),
+            'policy': from_canonical(np.frombuffer(policy, dtype=np.float64), orientation).tolist(),
+            'rootInfo': json.loads(root_info),
+            'turnNumber': turn_number,
+        })
+
+    def put(
+        self,
+        key: PositionKey,
+        rules: str,
+        komi: float,
+        model: str,
+        visits: int,
+        response: LazySuccessResponse
+    ):
+        position, orientation = key
+        raw = response.raw
+        root_info = {k: raw['rootInfo'][k] for k in _ROOT_INFO_FIELDS}
+        move_infos = []
+        for move_info in raw['moveInfos']:
+            simplified = {k: move_info[k] for k in _MOVE_INFO_FIELDS}
+            simplified['move'] = move_info['move']
+            if move_info.get('isSymmetryOf'):
+                simplified['isSymmetryOf'] = move_info['isSymmetryOf']
+            _orient_moves(simplified, lambda label: label_to_canonical(label, orientation))
+            move_infos.append(simplified)
+
+        self._connection.execute(
+            'INSERT OR REPLACE INTO searches '
+            '(position, rules, komi, model, visits, root_info, move_infos, policy, ownership, used) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                position,
+                rules,
+                komi,
+                model,
+                visits,
+                json.dumps(root_info),
+                json.dumps(move_infos),
+                to_canonical(response.policy, orientation).tobytes(),
+                to_canonical(response.ownership, orientation).tobytes(),
+                time.time(),
+            )
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.execute(
+            'DELETE FROM searches WHERE rowid IN ('
+            'SELECT rowid FROM searches ORDER BY used DESC LIMIT -1 OFFSET ?)',
+            (self._limit,)
+        )
+        self._connection.commit()
+        self._connection.close()
+
+
+def _orient_moves(move_info: Dict[str, Any], orient):
+    move_info['move'] = orient(move_info['move'])
+    if 'isSymmetryOf' in move_info:
+        move_info['isSymmetryOf'] = orient(move_info['isSymmetryOf'])
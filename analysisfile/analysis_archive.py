@@ -0,0 +1,77 @@
+import os
+import struct
+import zipfile
+from dataclasses import fields
+from typing import Dict
+
+import numpy as np
+
+from composeanalysis.game_analysis import GameAnalysis
+
+ANALYSIS_EXTENSION = '.npz'
+ANALYSIS_VERSION = 1
+
+# A zip entry's data follows its local header, whose length depends on the entry's name and extra field.
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_LENGTHS = slice(26, 30)
+
+
+def save_game_analysis(filename: str, analysis: GameAnalysis):
+    # Every column of the analysis is one array of an uncompressed npz, so any column can be memory mapped where it lies
+    # in the archive.  Written beside the target and swapped in, so a reader never sees half a file.
+    columns = {f.name: getattr(analysis, f.name) for f in fields(GameAnalysis)}
+    columns['coordinates'] = np.array(analysis.coordinates)
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'wb') as outfile:
+        np.savez(outfile, version=np.array(ANALYSIS_VERSION), **columns)
+    os.replace(temporary_filename, filename)
+
+
+def load_game_analysis(filename: str) -> GameAnalysis:
+    # Nothing but the headers is read up front; each column is paged in when something first touches it.
+    columns = map_columns(filename)
+    version = int(columns.pop('version'))
+    if version != ANALYSIS_VERSION:
+        raise ValueError(f'{filename} uses version {version} of the analysis format, not {ANALYSIS_VERSION}.')
+    columns['coordinates'] = tuple(columns['coordinates'].tolist())
+    return GameAnalysis(**columns)
+
+
+def read_analysis_version(filename: str) -> int:
+    return int(map_columns(filename)['version'])
+
+
+def map_columns(filename: str) -> Dict[str, np.ndarray]:
+    columns: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as infile:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    columns[name] = np.lib.format.read_array(member)
+                continue
+
+            infile.seek(info.header_offset)
+            name_length, extra_length = struct.unpack('<HH', infile.read(_LOCAL_HEADER_SIZE)[_LOCAL_HEADER_LENGTHS])
+            infile.seek(info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+            format_version = np.lib.format.read_magic(infile)
+            if format_version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(infile)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(infile)
+
+            # Empty and zero-dimensional arrays cannot be mapped, and are tiny anyway.
+            if not shape or 0 in shape:
+                infile.seek(info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+                columns[name] = np.lib.format.read_array(infile)
+                continue
+
+            columns[name] = np.memmap(
+                filename,
+                dtype=dtype,
+                mode='r',
+                offset=infile.tell(),
+                shape=shape,
+                order='F' if fortran_order else 'C'
+            )
+    return columns
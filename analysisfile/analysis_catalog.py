@@ -0,0 +1,101 @@
+import hashlib
+import json
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from domain.pass_enum import Pass
+
+# Only what changes the positions KataGo is shown identifies a game; names, dates, comments and formatting do not.
+_IDENTIFYING_PROPERTIES = ('AB', 'AW', 'HA', 'KM', 'RU', 'SZ')
+
+
+@dataclass
+class CatalogEntry:
+    filename: str
+    version: int
+    settings: Dict[str, Any]
+    subject: Optional[str]
+    complete: bool
+
+
+def game_hash(game: List[Dict[str, Any]]) -> str:
+    def normalize(value: Any) -> Any:
+        if isinstance(value, list):
+            return sorted(normalize(x) for x in value)
+        if isinstance(value, Pass) or str(value).lower() == 'pass':
+            return 'pass'
+        if isinstance(value, str):
+            return value.upper()
+        return float(value)
+
+    root = game[0]
+    setup = {name: normalize(root[name]) for name in _IDENTIFYING_PROPERTIES if name in root}
+    setup.setdefault('SZ', 19.)
+    moves = [[color, normalize(node[color])] for node in game[1:] for color in ('B', 'W') if color in node]
+    content = json.dumps({'setup': setup, 'moves': moves}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class AnalysisCatalog:
+    # Every analysis is registered here under the hash of its game, with the format version and the settings it was
+    # written with, so finding it never depends on its filename.  An analysis is marked complete only once its final
+    # version has been saved.
+    def __init__(self, filename: str):
+        self._filename: str = filename
+        self._connection: sqlite3.Connection = sqlite3.connect(filename, timeout=60.)
+        # Concurrently analyzed games share the file, and every change is committed as soon as it is made.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS analyses ('
+            'game TEXT PRIMARY KEY, '
+            'filename TEXT NOT NULL UNIQUE, '
+            'version INTEGER NOT NULL, '
+            'settings TEXT NOT NULL, '
+            'subject TEXT, '
+            'complete INTEGER NOT NULL)'
+        )
+        self._connection.commit()
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    def get(self, game: str) -> Optional[CatalogEntry]:
+        row = self._connection.execute(
+            'SELECT filename, version, settings, subject, complete FROM analyses WHERE game = ?',
+            (game,)
+        ).fetchone()
+        if row is None:
+            return None
+        filename, version, settings, subject, complete = row
+        return CatalogEntry(filename, version, json.loads(settings), subject, bool(complete))
+
+    def contains(self, filename: str) -> bool:
+        row = self._connection.execute(
+            'SELECT 1 FROM analyses WHERE filename = ?',
+            (filename,)
+        ).fetchone()
+        return row is not None
+
+    def put(self, game: str, entry: CatalogEntry):
+        # A file holds one game's analysis, so any other game registered under this filename has been overwritten.
+        self._connection.execute('DELETE FROM analyses WHERE filename = ? AND game != ?', (entry.filename, game))
+        self._connection.execute(
+            'INSERT OR REPLACE INTO analyses (game, filename, version, settings, subject, complete) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (
+                game,
+                entry.filename,
+                entry.version,
+                json.dumps(entry.settings, sort_keys=True),
+                entry.subject,
+                entry.complete
+            )
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
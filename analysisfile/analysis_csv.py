@@ -0,0 +1,167 @@
+import csv
+import json
+import math
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from composeanalysis.coordinate_labels import coordinate_labels
+from composeanalysis.game_analysis import POLICY_COLUMNS, POLICY_LABELS, GameAnalysis
+
+SCALAR_HEADERS = [
+    'Move',
+    'Player',
+    'Prior Lead',
+    'Posterior Lead',
+    'Loss',
+    'Prior Win Rate',
+    'Posterior Win Rate',
+    'Drop',
+    'Played',
+    'Played Search',
+    'Best',
+    'Best Search',
+    'Counts as Best',
+    'Counts as Match',
+    'Expected Loss',
+    'Random',
+    *POLICY_COLUMNS,
+]
+HEADERS = [*SCALAR_HEADERS, *(f'{column} Policy' for column in POLICY_COLUMNS), 'Search', 'Interpolated']
+
+
+def write_analysis_csv(filename: str, analysis: GameAnalysis):
+    # The original analysis format: one row per move, with every policy and the simplified search response embedded as
+    # JSON.  Written beside the target and swapped in, so a reader never sees half a file.
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w', encoding='utf-8') as csvfile:
+        csvfile.write(','.join(HEADERS) + '\n')
+
+        # The columns are converted to text whole and then written out row by row.
+        priors = analysis.priors
+        columns = [
+            [str(x) for x in analysis.move.tolist()],
+            analysis.player.tolist(),
+            [str(x) for x in analysis.prior_lead.tolist()],
+            [str(x) for x in analysis.posterior_lead.tolist()],
+            [str(x) for x in analysis.loss.tolist()],
+            [str(x) for x in analysis.prior_win_rate.tolist()],
+            [str(x) for x in analysis.posterior_win_rate.tolist()],
+            [str(x) for x in analysis.drop.tolist()],
+            analysis.played.tolist(),
+            [str(x) for x in analysis.played_search.tolist()],
+            analysis.best.tolist(),
+            [str(x) for x in analysis.best_search.tolist()],
+            [str(x) for x in analysis.counts_as_best.tolist()],
+            [str(x) for x in analysis.counts_as_match.tolist()],
+            [str(x) for x in analysis.expected_loss.tolist()],
+            priors['random'].astype(str).tolist(),
+            *(priors[label].astype(str).tolist() for label in POLICY_LABELS),
+            *(csv_escape_policies(analysis.coordinates, analysis.policies[:, j]) for j in range(len(POLICY_LABELS))),
+            [csv_escape_json(analysis.search(i)) for i in range(len(analysis))],
+            [csv_escape_json(analysis.interpolated_labels(i)) for i in range(len(analysis))],
+        ]
+        for row in zip(*columns):
+            csvfile.write(','.join(row) + '\n')
+    os.replace(temporary_filename, filename)
+
+
+def csv_escape_json(raw: Any) -> str:
+    return f'''"{json.dumps(raw).replace('"', '""')}"'''
+
+
+def csv_escape_policies(coordinates: Tuple[str, ...], policies: np.ndarray) -> List[str]:
+    # Writes each policy as an escaped JSON map of its legal moves, without building the maps first.
+    keys = np.array([f'""{label}"": ' for label in coordinates])
+    values = policies.astype(str)
+    cells = []
+    for policy, text in zip(policies, values):
+        if np.isnan(policy[0]):
+            cells.append('"null"')
+            continue
+        legal = policy > -0.5
+        cells.append('"{' + ', '.join(np.char.add(keys[legal], text[legal]).tolist()) + '}"')
+    return cells
+
+
+def read_analysis_csv(filename: str) -> GameAnalysis:
+    # Rebuilds the analysis a CSV was written from.  Everything the CSV holds is either kept or derived again from what
+    # is kept, and the derived columns are checked against the file, so a conversion that would lose anything fails.
+    with open(filename, 'r', encoding='utf-8', newline='') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    if not rows:
+        raise ValueError(f'{filename} has no moves.')
+    missing = [header for header in HEADERS[:-1] if header not in rows[0]]
+    if missing:
+        raise ValueError(f'{filename} is not an analysis CSV; it lacks {", ".join(missing)}.')
+
+    searches = [json.loads(row['Search']) for row in rows]
+    size = math.isqrt(len(searches[0]['policy']) - 1)
+    coordinates = coordinate_labels(size)
+    label_to_index = {label: j for j, label in enumerate(coordinates)}
+
+    # Policies are kept at float32 when that reproduces every value as written, which holds for every CSV written since
+    # policies have been held as float32.
+    policies = np.full((len(rows), len(POLICY_LABELS), len(coordinates)), np.nan)
+    for i, row in enumerate(rows):
+        for j, column in enumerate(POLICY_COLUMNS):
+            policy: Dict[str, float] = json.loads(row[f'{column} Policy'])
+            if policy is None:
+                continue
+            policies[i, j] = -1.
+            for label, value in policy.items():
+                policies[i, j, label_to_index[label]] = value
+    narrowed = policies.astype(np.float32)
+    if np.array_equal(narrowed.astype(str).astype(np.float64), policies, equal_nan=True):
+        policies = narrowed
+
+    interpolated = np.zeros((len(rows), len(POLICY_LABELS)), dtype=bool)
+    for i, row in enumerate(rows):
+        for label in json.loads(row.get('Interpolated') or '[]'):
+            interpolated[i, POLICY_LABELS.index(label)] = True
+
+    move_infos = [mi for search in searches for mi in search['moveInfos']]
+    analysis = GameAnalysis(
+        move=np.array([int(row['Move']) for row in rows], dtype=np.int64),
+        player=np.array([row['Player'] for row in rows], dtype=str),
+        prior_lead=np.array([float(row['Prior Lead']) for row in rows]),
+        posterior_lead=np.array([float(row['Posterior Lead']) for row in rows]),
+        prior_win_rate=np.array([float(row['Prior Win Rate']) for row in rows]),
+        posterior_win_rate=np.array([float(row['Posterior Win Rate']) for row in rows]),
+        played_index=np.array([label_to_index[row['Played']] for row in rows], dtype=np.int16),
+        best_index=np.array([label_to_index[row['Best']] for row in rows], dtype=np.int16),
+        played_search=np.array([int(row['Played Search']) for row in rows], dtype=np.int64),
+        best_search=np.array([int(row['Best Search']) for row in rows], dtype=np.int64),
+        root_visits=np.array([search['rootInfo']['visits'] for search in searches], dtype=np.int64),
+        counts_as_best=np.array([int(row['Counts as Best']) for row in rows], dtype=np.int64),
+        counts_as_match=np.array([int(row['Counts as Match']) for row in rows], dtype=np.int64),
+        expected_loss=np.array([float(row['Expected Loss']) for row in rows]),
+        coordinates=coordinates,
+        policies=policies,
+        interpolated=interpolated,
+        search_policy=np.array([search['policy'] for search in searches], dtype=np.float64),
+        ownership=np.array([list(search['ownership'].values()) for search in searches], dtype=np.float64),
+        move_info_offsets=np.cumsum([0, *(len(search['moveInfos']) for search in searches)], dtype=np.int64),
+        move_info_move=np.array([label_to_index[mi['move']] for mi in move_infos], dtype=np.int16),
+        move_info_symmetry_of=np.array(
+            [label_to_index[mi['isSymmetryOf']] if mi['isSymmetryOf'] else -1 for mi in move_infos],
+            dtype=np.int16
+        ),
+        move_info_order=np.array([mi['order'] for mi in move_infos], dtype=np.int64),
+        move_info_prior=np.array([mi['prior'] for mi in move_infos], dtype=np.float64),
+        move_info_score_lead=np.array([mi['scoreLead'] for mi in move_infos], dtype=np.float64),
+        move_info_visits=np.array([mi['visits'] for mi in move_infos], dtype=np.int64),
+        move_info_winrate=np.array([mi['winrate'] for mi in move_infos], dtype=np.float64)
+    )
+
+    derived = analysis.frame()
+    for header in ('Loss', 'Drop', 'Random', *POLICY_COLUMNS):
+        expected = derived[header].to_numpy()
+        written = np.array([float(row[header]) for row in rows]).astype(expected.dtype)
+        if not np.array_equal(written, expected, equal_nan=True):
+            raise ValueError(f'{filename} has {header} values that do not follow from the rest of the analysis.')
+    for i, search in enumerate(searches):
+        if search != analysis.search(i):
+            raise ValueError(f'{filename} has a search on row {i + 1} that cannot be stored exactly.')
+    return analysis
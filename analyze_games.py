@@ -0,0 +1,28 @@
+import os
+import sys
+from glob import glob
+
+import main
+from main import analyze_games, load_configuration, prep_katago
+
+if __name__ == '__main__':
+    configuration = load_configuration()
+    prep_katago(configuration['katago'])
+
+    sgf_filenames = []
+    for target in sys.argv[1:]:
+        if os.path.isdir(target):
+            sgf_filenames.extend(sorted(glob(os.path.join(target, '**', '*.sgf'), recursive=True)))
+        elif os.path.isfile(target):
+            sgf_filenames.append(target)
+        else:
+            print(f'ERROR! Received a path that does not exist: {target}')
+
+    analyses = analyze_games(sgf_filenames, configuration, configuration.get('games_in_flight', 1))
+    failed = [sgf_filename for sgf_filename, analysis_filename in analyses.items() if analysis_filename is None]
+    print(f'Analyzed {len(analyses) - len(failed)} of {len(analyses)} games.')
+
+    if main.katago:
+        main.katago.kill()
+    if failed:
+        sys.exit(1)
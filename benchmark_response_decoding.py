@@ -0,0 +1,86 @@
+import json
+import sys
+import timeit
+from typing import Callable
+
+from katago.response import SuccessResponse, parse_success_response
+from katago.shared import str_to_enum
+
+# Compares the original dataclasses_json decoding of a KataGo analysis response with the lazy decoder that the engines use
+# now.  Pass the path of a file holding one response per line to benchmark real KataGo output; otherwise a synthetic 19x19
+# response with ownership and policy is used.
+#
+#     python benchmark_response_decoding.py [responses.jsonl] [repetitions]
+
+
+def synthesize_response() -> str:
+    letters = 'ABCDEFGHJKLMNOPQRST'
+    move_infos = []
+    for order in range(20):
+        move = f'{letters[order % 19]}{order % 19 + 1}'
+        move_infos.append({
+            'edgeVisits': 1000 - order, 'edgeWeight': 1000. - order, 'lcb': 0.5, 'move': move, 'order': order,
+            'playSelectionValue': 1000. - order, 'prior': 0.05, 'scoreLead': 1. - order * 0.1, 'scoreMean': 1.,
+            'scoreSelfplay': 1.2, 'scoreStdev': 10., 'utility': 0.1, 'utilityLcb': 0.05, 'visits': 1000 - order * 40,
+            'weight': 1000. - order, 'winrate': 0.5 - order * 0.01,
+            'pv': [letters[(order + j) % 19] + str((order * j) % 19 + 1) for j in range(15)],
+        })
+    policy = [1. / 362] * 362
+    return json.dumps({
+        'id': 'benchmark',
+        'isDuringSearch': False,
+        'turnNumber': 120,
+        'moveInfos': move_infos,
+        'rootInfo': {
+            'currentPlayer': 'B', 'rawLead': 0.1, 'rawNoResultProb': 0., 'rawScoreSelfplay': 0.1,
+            'rawScoreSelfplayStdev': 1., 'rawStScoreError': 1., 'rawStWrError': 0.1, 'rawVarTimeLeft': 1.,
+            'rawWinrate': 0.5, 'scoreSelfplay': 0.1, 'scoreLead': 0.1, 'scoreStdev': 1., 'symHash': 'AB',
+            'thisHash': 'CD', 'utility': 0., 'visits': 20000, 'weight': 20000., 'winrate': 0.5
+        },
+        'policy': policy,
+        'humanPolicy': policy,
+        'ownership': [0.25] * 361,
+    })
+
+
+def decode_with_dataclasses(line: str) -> SuccessResponse:
+    response = SuccessResponse.from_json(line)
+    for mi in response.move_infos:
+        mi.move = str_to_enum(mi.move)
+        mi.pv = [str_to_enum(x) for x in mi.pv]
+    return response
+
+
+def touch(response) -> float:
+    # Read what compose_analysis reads, so that the lazy decoder pays for everything it would pay for in a real run.
+    total = response.root_info.visits + response.turn_number + len(response.root_info.current_player.value)
+    for mi in response.move_infos:
+        total += mi.visits + mi.prior + mi.score_lead + mi.winrate + mi.order + len(mi.move.value)
+    total += sum(response.policy) + sum(response.ownership) + sum(response.human_policy)
+    return total
+
+
+def measure(label: str, lines, decode: Callable[[str], object], repetitions: int) -> float:
+    seconds = min(timeit.repeat(lambda: [touch(decode(line)) for line in lines], number=1, repeat=repetitions))
+    per_line = seconds / len(lines)
+    print(f'{label:>16}: {seconds:0.4f} s for {len(lines)} responses; {per_line * 1e6:0.1f} us per response.')
+    return per_line
+
+
+def run(path: str | None, repetitions: int):
+    if path:
+        with open(path, 'r', encoding='utf-8') as infile:
+            lines = [line.strip() for line in infile if line.strip()]
+    else:
+        lines = [synthesize_response()] * 200
+
+    baseline = measure('dataclasses_json', lines, decode_with_dataclasses, repetitions)
+    lazy = measure('lazy', lines, parse_success_response, repetitions)
+    print(f'Speedup: {baseline / lazy:0.1f}x')
+
+
+if __name__ == '__main__':
+    run(
+        sys.argv[1] if len(sys.argv) > 1 else None,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    )
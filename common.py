@@ -10,7 +10,7 @@ ImageData = namedtuple('ImageData', 'filename width height')
 
 
 def get_filename_core(analysis_filename: str) -> str:
-    return re.match(r'^(?:[^\\/]*[\\/])*(.*)\.csv$', analysis_filename).group(1)
+    return re.match(r'^(?:[^\\/]*[\\/])*(.*)\.(?:csv|npz)$', analysis_filename).group(1)
 
 
 def render_html(html: str, filename: str) -> Tuple[int, int]:
@@ -0,0 +1,31 @@
+from typing import Optional
+
+from composeanalysis.is_subject_turn import is_subject_turn
+from katago.query import Query
+
+# KataGo's analysis threads start the highest priority positions first.  The reviewed player's moves are scored before
+# anything else, and each player's deep searches come before the human profile passes that share their turns.
+SUBJECT_SEARCH_PRIORITY = 3
+SUBJECT_PROFILE_PRIORITY = 2
+OPPONENT_SEARCH_PRIORITY = 1
+OPPONENT_PROFILE_PRIORITY = 0
+
+
+def assign_priorities(query: Query, subject: Optional[str], search: bool):
+    # A move's loss needs the searches of the positions before and after it, but its contribution to the rating
+    # posterior only needs the human policies of the position it was played in.
+    if subject is None or not query.analyze_turns:
+        return
+
+    priorities = []
+    for turn in query.analyze_turns:
+        if search:
+            relevant = (
+                is_subject_turn(query.moves, subject, turn) or
+                turn > 0 and is_subject_turn(query.moves, subject, turn - 1)
+            )
+            priorities.append(SUBJECT_SEARCH_PRIORITY if relevant else OPPONENT_SEARCH_PRIORITY)
+        else:
+            relevant = is_subject_turn(query.moves, subject, turn)
+            priorities.append(SUBJECT_PROFILE_PRIORITY if relevant else OPPONENT_PROFILE_PRIORITY)
+    query.priorities = priorities
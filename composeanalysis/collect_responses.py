@@ -0,0 +1,118 @@
+import time
+from threading import Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from katago import HumanProfile
+from katago.queryhandle import QueryHandle
+from katago.response import SuccessResponse
+
+
+def collect_responses(
+    handle: QueryHandle,
+    query_ids: Dict[Optional[HumanProfile], str],
+    position_count: int,
+    start: float,
+    snapshot: Optional[Callable[[List[SuccessResponse], Dict[int, Dict[HumanProfile, np.ndarray]]], None]] = None,
+    snapshot_every: Optional[float] = None,
+    cached_policies: Optional[Dict[int, Dict[HumanProfile, np.ndarray]]] = None,
+    on_human_policy: Optional[Callable[[int, HumanProfile, np.ndarray], None]] = None,
+    cached_searches: Optional[List[SuccessResponse]] = None,
+    on_search: Optional[Callable[[SuccessResponse], None]] = None
+) -> Tuple[List[SuccessResponse], Dict[int, Dict[HumanProfile, np.ndarray]]]:
+    # Every query of the game shares one bounded handle, so responses have to be consumed in whatever order KataGo
+    # finishes them.  Each human profile response is reduced to its policy immediately so that it can be released.
+    # Cached policies and searches were never queried, so they count as answered from the start.
+    id_to_profile = {query_id: profile for profile, query_id in query_ids.items()}
+    search_responses: List[SuccessResponse] = list(cached_searches or [])
+    turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]] = {
+        turn: dict(profiles) for turn, profiles in (cached_policies or {}).items()
+    }
+    profile_positions = position_count - 1
+    profile_progress: Dict[HumanProfile, int] = {}
+    for profiles in turn_to_profile_to_policy.values():
+        for profile in profiles:
+            profile_progress[profile] = profile_progress.get(profile, 0) + 1
+    profiles_complete = sum(profile_progress.values())
+    searches_expected = position_count - len(search_responses) if None in query_ids else 0
+    total_profiles = profiles_complete + handle.expected - searches_expected
+
+    # The freshest estimate for each position, partial or final.  A snapshot is only possible once every position has
+    # one and every human profile has answered, since each row needs the following position's lead and all priors.
+    # Snapshots are taken on a worker thread so that the handle keeps draining meanwhile; one that comes due while the
+    # last is still being written is skipped.
+    latest: Dict[int, SuccessResponse] = {r.turn_number: r for r in search_responses}
+    last_snapshot = time.time()
+    snapshot_thread: Optional[Thread] = None
+    snapshot_errors: List[BaseException] = []
+
+    def take_snapshot(responses: List[SuccessResponse], policies: Dict[int, Dict[HumanProfile, np.ndarray]]):
+        try:
+            snapshot(responses, policies)
+        except BaseException as e:
+            snapshot_errors.append(e)
+
+    try:
+        for response in handle:
+            human_profile = id_to_profile[response.id]
+            if human_profile is None and snapshot is not None:
+                latest[response.turn_number] = response
+                if snapshot_errors:
+                    raise snapshot_errors[0]
+                if (
+                    time.time() - last_snapshot >= (snapshot_every or 0.) and
+                    len(latest) == position_count and
+                    profiles_complete == total_profiles and
+                    (snapshot_thread is None or not snapshot_thread.is_alive())
+                ):
+                    elapsed = time.time() - start
+                    print(f'Refreshing the provisional analysis; {elapsed:0.3f} seconds elapsed.')
+                    snapshot_thread = Thread(
+                        target=take_snapshot,
+                        args=(
+                            [latest[turn] for turn in sorted(latest)],
+                            {turn: dict(profiles) for turn, profiles in turn_to_profile_to_policy.items()}
+                        ),
+                        daemon=True
+                    )
+                    snapshot_thread.start()
+                    last_snapshot = time.time()
+
+            if response.is_during_search:
+                continue
+
+            if human_profile is None:
+                search_responses.append(response)
+                if on_search is not None:
+                    on_search(response)
+                done = len(search_responses)
+                elapsed = time.time() - start
+                print(
+                    f'{done} positions analyzed.  Position #{response.turn_number} completed; {elapsed:0.3f} seconds '
+                    f'elapsed; {elapsed / done:0.3f} SPP.'
+                )
+                continue
+
+            if response.turn_number not in turn_to_profile_to_policy:
+                turn_profiles: Dict[HumanProfile, np.ndarray] = {}
+                turn_to_profile_to_policy[response.turn_number] = turn_profiles
+            else:
+                turn_profiles = turn_to_profile_to_policy[response.turn_number]
+            turn_profiles[human_profile] = response.human_policy.astype(np.float32)
+            if on_human_policy is not None:
+                on_human_policy(response.turn_number, human_profile, response.human_policy)
+
+            profiles_complete += 1
+            profile_progress[human_profile] = profile_progress.get(human_profile, 0) + 1
+            if profile_progress[human_profile] == profile_positions:
+                print(f'{profiles_complete} / {total_profiles} profiles complete...')
+    finally:
+        # A provisional analysis must never land after the final one.
+        if snapshot_thread is not None:
+            snapshot_thread.join()
+    if snapshot_errors:
+        raise snapshot_errors[0]
+
+    search_responses.sort(key=lambda r: r.turn_number)
+    return search_responses, turn_to_profile_to_policy
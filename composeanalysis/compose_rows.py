@@ -0,0 +1,187 @@
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from composeanalysis.coordinate_labels import coordinate_labels
+from composeanalysis.game_analysis import POLICY_LABELS, GameAnalysis
+from composeanalysis.handle_symmetries_in_search import handle_symmetries_in_search
+from composeanalysis.simplify_human_profile import simplify_human_profile
+from katago import HumanProfile
+from katago.response import SuccessResponse
+
+
+def compose_rows(
+    search_responses: List[SuccessResponse],
+    turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]],
+    position_count: int,
+    size: int,
+    sgf: List[Dict],
+    configuration: Dict,
+    turn_to_interpolated: Optional[Dict[int, List[HumanProfile]]] = None
+) -> GameAnalysis:
+    lead_drop = configuration['accuracy']['lead_drop']
+    max_visit_ratio = configuration['accuracy']['max_visit_ratio']
+    top_moves = configuration['accuracy']['top_moves']
+    winrate_drop = configuration['accuracy']['winrate_drop']
+
+    # Pull what the scoring needs out of every search into arrays.  The candidates of each position are padded out to
+    # the longest candidate list, and `representative` holds the index of the played move (or of the candidate it is a
+    # symmetry of) among them, or -1 if KataGo did not consider it.
+    count = position_count - 1
+    kept_per_turn = []
+    representative = np.full(count, -1)
+    player = np.empty(count, dtype=object)
+    played = np.empty(count, dtype=object)
+    best = np.empty(count, dtype=object)
+    root_visits = np.zeros(count, dtype=np.int64)
+    for i in range(count):
+        response = search_responses[i]
+        player[i] = response.root_info.current_player.value
+        root_visits[i] = response.root_info.visits
+        best[i] = response.move_infos[0].move.value
+        played[i] = sgf[i + 1][player[i]] or 'pass'
+
+        kept_infos, move_to_info, _ = handle_symmetries_in_search(response.move_infos)
+        kept_per_turn.append(kept_infos)
+        if played[i] in move_to_info:
+            representative[i] = kept_infos.index(move_to_info[played[i]])
+
+    width = max(len(kept_infos) for kept_infos in kept_per_turn) if count else 1
+    kept_count = np.array([len(kept_infos) for kept_infos in kept_per_turn], dtype=np.int64)
+    candidate_lead = np.zeros((count, width))
+    candidate_win_rate = np.zeros((count, width))
+    candidate_visits = np.zeros((count, width), dtype=np.int64)
+    candidate_prior = np.zeros((count, width))
+    for i, kept_infos in enumerate(kept_per_turn):
+        for j, mi in enumerate(kept_infos):
+            candidate_lead[i, j] = mi.score_lead
+            candidate_win_rate[i, j] = mi.winrate
+            candidate_visits[i, j] = mi.visits
+            candidate_prior[i, j] = mi.prior
+
+    # The favorite's estimates of every position, with the final position's closing the list.
+    raw_lead = np.array([search_responses[i].move_infos[0].score_lead for i in range(position_count)])
+    raw_win_rate = np.array([search_responses[i].move_infos[0].winrate for i in range(position_count)])
+    turn_numbers = np.array([search_responses[i].turn_number for i in range(1, position_count)], dtype=np.int64)
+
+    # If the player played a symmetry of the favorite move, this counts as a best and match move.  Simultaneously
+    # correct the prior lead and win rate to account for the note below.
+    #
+    # Developer's Note: (J. Craig, 2022-01-12)
+    # Adding logic to track how each player's moves compared with the best move and policy favorite revealed that
+    # KG's score estimation can be further off than I thought.  If the player plays the AI's best move, the move should
+    # never be considered a mistake.  That position's score needs to be pushed to the previous move as the expected
+    # result.
+    #
+    # Pushing the score back through a run of favorite moves flips its perspective once per move, so every position
+    # takes the estimate of the first position at or after it whose move was not the favorite, flipped by the parity of
+    # the distance between them.
+    played_favorite = np.append(representative == 0, False)
+    indices = np.arange(position_count)
+    source = np.minimum.accumulate(np.where(played_favorite, position_count, indices)[::-1])[::-1]
+    flipped = (source - indices) % 2 == 1
+    corrected_lead = np.where(flipped, -raw_lead[source], raw_lead[source])
+    corrected_win_rate = np.where(flipped, 1. - raw_win_rate[source], raw_win_rate[source])
+    prior_lead = corrected_lead[:-1]
+    prior_win_rate = corrected_win_rate[:-1]
+    posterior_lead = -corrected_lead[1:]
+    posterior_win_rate = 1. - corrected_win_rate[1:]
+
+    # I expand the common definition of a "best" move to include moves that do not deviate too far from the favorite
+    # move's results.  This means that moves that KataGo did not consider yet do as well as the favorite move will
+    # count as both a best and match move.
+    close_to_favorite = (prior_lead - posterior_lead < lead_drop) & (prior_win_rate - posterior_win_rate < winrate_drop)
+    counts_as_best = played_favorite[:-1] | close_to_favorite
+
+    # Otherwise, the move does not count as a "best" move.  It may still count as a match.  We need to find the moves
+    # that KataGo would treat as matches.  These are the top N moves that have enough visits for the results to be
+    # considered somewhat reliable; the first candidate short of the visits ends the search.
+    best_search = candidate_visits[:, 0] if count else np.zeros(0, dtype=np.int64)
+    threshold = np.floor(best_search * max_visit_ratio)
+    columns = np.arange(width)
+    reliable = (columns >= 1) & (columns < top_moves) & (columns < kept_count[:, None])
+    reliable &= candidate_visits >= threshold[:, None]
+    reached = np.cumprod(reliable[:, 1:], axis=1).astype(bool)
+    matches = (
+        (representative[:, None] == columns[1:]) |
+        (candidate_lead[:, 1:] - posterior_lead[:, None] < lead_drop) &
+        (candidate_win_rate[:, 1:] - posterior_win_rate[:, None] < winrate_drop)
+    )
+    counts_as_match = counts_as_best | np.any(reached & matches, axis=1)
+
+    # Capture the visit counts necessary for calculating Accuracy and Best Match %.
+    played_search = np.where(
+        representative >= 0,
+        candidate_visits[np.arange(count), np.maximum(representative, 0)],
+        0
+    )
+
+    # Calculate KG's expected loss, accumulating candidate by candidate in the order KataGo ranked them.
+    expected_loss = np.zeros(count)
+    seen = candidate_prior[:, 0].copy()
+    for j in range(1, width):
+        present = j < kept_count
+        expected_loss += np.where(present, (prior_lead - candidate_lead[:, j]) * candidate_prior[:, j], 0.)
+        seen += np.where(present, candidate_prior[:, j], 0.)
+    expected_loss /= seen
+
+    # Gather every policy into one tensor of turns by profiles by board points, with KataGo's own policy last.  A
+    # subject-only analysis has no human policies on the opponent's turns; those are left as NaN.  The simplified
+    # search responses are kept alongside it.
+    coordinates = coordinate_labels(size)
+    label_to_index = {label: j for j, label in enumerate(coordinates)}
+    profile_to_index = {hp: POLICY_LABELS.index(simplify_human_profile(hp)) for hp in HumanProfile}
+    policies = np.full((count, len(POLICY_LABELS), len(coordinates)), np.nan, dtype=np.float32)
+    interpolated = np.zeros((count, len(POLICY_LABELS)), dtype=bool)
+    search_policy = np.zeros((count, len(coordinates)))
+    ownership = np.zeros((count, size * size))
+    move_infos = []
+    for i in range(count):
+        current_policies = turn_to_profile_to_policy.get(i, {})
+        for hp in HumanProfile:
+            if hp in current_policies:
+                policies[i, profile_to_index[hp]] = current_policies[hp]
+        for hp in (turn_to_interpolated or {}).get(i, []):
+            interpolated[i, profile_to_index[hp]] = True
+
+        current_response = search_responses[i]
+        policies[i, -1] = current_response.policy
+        search_policy[i] = current_response.policy
+        ownership[i] = current_response.ownership
+        move_infos.append(current_response.move_infos)
+
+    return GameAnalysis(
+        move=turn_numbers,
+        player=player.astype(str),
+        prior_lead=prior_lead,
+        posterior_lead=posterior_lead,
+        prior_win_rate=prior_win_rate,
+        posterior_win_rate=posterior_win_rate,
+        played_index=np.array([label_to_index[str(move)] for move in played], dtype=np.int16),
+        best_index=np.array([label_to_index[move] for move in best], dtype=np.int16),
+        played_search=played_search,
+        best_search=best_search,
+        root_visits=root_visits,
+        counts_as_best=counts_as_best.astype(np.int64),
+        counts_as_match=counts_as_match.astype(np.int64),
+        expected_loss=expected_loss,
+        coordinates=coordinates,
+        policies=policies,
+        interpolated=interpolated,
+        search_policy=search_policy,
+        ownership=ownership,
+        move_info_offsets=np.cumsum([0, *(len(infos) for infos in move_infos)], dtype=np.int64),
+        move_info_move=np.array(
+            [label_to_index[mi.move.value] for infos in move_infos for mi in infos],
+            dtype=np.int16
+        ),
+        move_info_symmetry_of=np.array(
+            [label_to_index[mi.is_symmetry_of] if mi.is_symmetry_of else -1 for infos in move_infos for mi in infos],
+            dtype=np.int16
+        ),
+        move_info_order=np.array([mi.order for infos in move_infos for mi in infos], dtype=np.int64),
+        move_info_prior=np.array([mi.prior for infos in move_infos for mi in infos], dtype=np.float64),
+        move_info_score_lead=np.array([mi.score_lead for infos in move_infos for mi in infos], dtype=np.float64),
+        move_info_visits=np.array([mi.visits for infos in move_infos for mi in infos], dtype=np.int64),
+        move_info_winrate=np.array([mi.winrate for infos in move_infos for mi in infos], dtype=np.float64)
+    )
@@ -0,0 +1,10 @@
+from functools import lru_cache
+from typing import Tuple
+
+from composeanalysis.index_to_coordinate_label import index_to_coordinate_label
+
+
+@lru_cache
+def coordinate_labels(size: int) -> Tuple[str, ...]:
+    # The label of every entry of a policy on a board of this size, pass last.  Shared by every policy of every game.
+    return tuple(index_to_coordinate_label(i, size) for i in range(size * size + 1))
@@ -0,0 +1,158 @@
+import functools
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from composeanalysis.simplify_human_profile import simplify_human_profile
+from katago import HumanProfile
+
+# The profiles of the policy tensor, weakest first, followed by KataGo's own policy, and the names of their columns.
+POLICY_LABELS: List[str] = [*dict.fromkeys(simplify_human_profile(hp) for hp in HumanProfile), 'AI']
+POLICY_COLUMNS: List[str] = ['Pro' if label == 'pro' else label for label in POLICY_LABELS]
+
+
+@dataclass
+class GameAnalysis:
+    # One entry per scored move, stored column by column.  Row i scores the move played from position i, so every array
+    # is as long as the game has moves.  Moves are stored as indices into `coordinates`.
+    #
+    # The policies are one tensor of moves by POLICY_LABELS by `coordinates`, with -1 marking illegal moves and NaN
+    # marking profiles that were not measured.  It is float32 unless it came from a CSV whose values need more.  The
+    # candidates KataGo searched at each position form one table: those of row i are the entries from
+    # move_info_offsets[i] up to move_info_offsets[i + 1].  A candidate that is no symmetry of another has a
+    # move_info_symmetry_of of -1.
+    move: np.ndarray
+    player: np.ndarray
+    prior_lead: np.ndarray
+    posterior_lead: np.ndarray
+    prior_win_rate: np.ndarray
+    posterior_win_rate: np.ndarray
+    played_index: np.ndarray
+    best_index: np.ndarray
+    played_search: np.ndarray
+    best_search: np.ndarray
+    root_visits: np.ndarray
+    counts_as_best: np.ndarray
+    counts_as_match: np.ndarray
+    expected_loss: np.ndarray
+    coordinates: Tuple[str, ...]
+    policies: np.ndarray
+    interpolated: np.ndarray
+    search_policy: np.ndarray
+    ownership: np.ndarray
+    move_info_offsets: np.ndarray
+    move_info_move: np.ndarray
+    move_info_symmetry_of: np.ndarray
+    move_info_order: np.ndarray
+    move_info_prior: np.ndarray
+    move_info_score_lead: np.ndarray
+    move_info_visits: np.ndarray
+    move_info_winrate: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.move)
+
+    @property
+    def played(self) -> np.ndarray:
+        return np.asarray(self.coordinates)[self.played_index]
+
+    @property
+    def best(self) -> np.ndarray:
+        return np.asarray(self.coordinates)[self.best_index]
+
+    @property
+    def loss(self) -> np.ndarray:
+        return self.prior_lead - self.posterior_lead
+
+    @property
+    def drop(self) -> np.ndarray:
+        return self.prior_win_rate - self.posterior_win_rate
+
+    @property
+    def priors(self) -> Dict[str, np.ndarray]:
+        # The probability each profile gave the move that was played.  A random player picks uniformly among the legal
+        # moves.
+        played = self.policies[np.arange(len(self)), :, self.played_index]
+        priors = {label: played[:, j] for j, label in enumerate(POLICY_LABELS)}
+        priors['random'] = 1. / np.count_nonzero(self.policies[:, -1] > -0.5, axis=1)
+        return priors
+
+    def frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        # The scalar columns, named as in the CSV format.  Only the requested columns are built, so the policies are not
+        # read unless a prior is asked for.
+        priors: Dict[str, np.ndarray] = {}
+
+        def prior(label: str) -> np.ndarray:
+            if not priors:
+                priors.update(self.priors)
+            return priors[label]
+
+        builders: Dict[str, Callable[[], np.ndarray]] = {
+            'Move': lambda: self.move,
+            'Player': lambda: self.player,
+            'Prior Lead': lambda: self.prior_lead,
+            'Posterior Lead': lambda: self.posterior_lead,
+            'Loss': lambda: self.loss,
+            'Prior Win Rate': lambda: self.prior_win_rate,
+            'Posterior Win Rate': lambda: self.posterior_win_rate,
+            'Drop': lambda: self.drop,
+            'Played': lambda: self.played,
+            'Played Search': lambda: self.played_search,
+            'Best': lambda: self.best,
+            'Best Search': lambda: self.best_search,
+            'Counts as Best': lambda: self.counts_as_best,
+            'Counts as Match': lambda: self.counts_as_match,
+            'Expected Loss': lambda: self.expected_loss,
+            'Random': lambda: prior('random'),
+            **{column: functools.partial(prior, label) for label, column in zip(POLICY_LABELS, POLICY_COLUMNS)},
+        }
+        return pd.DataFrame({column: builders[column]() for column in columns or builders})
+
+    def policy(self, i: int, column: str) -> Optional[Dict[str, float]]:
+        # The legal moves of one profile's policy at row i, by label, or None if the profile was not measured there.
+        policy = self.policies[i, POLICY_COLUMNS.index(column)]
+        if np.isnan(policy[0]):
+            return None
+        legal = np.flatnonzero(policy > -0.5)
+        return dict(zip(np.asarray(self.coordinates)[legal].tolist(), policy[legal].tolist()))
+
+    def interpolated_labels(self, i: int) -> List[str]:
+        return [POLICY_LABELS[j] for j in np.flatnonzero(self.interpolated[i])]
+
+    def search(self, i: int) -> Dict[str, Any]:
+        # The simplified search response of row i.
+        start, end = self.move_info_offsets[i], self.move_info_offsets[i + 1]
+        coordinates = self.coordinates
+        columns = (
+            self.move_info_symmetry_of,
+            self.move_info_move,
+            self.move_info_order,
+            self.move_info_prior,
+            self.move_info_score_lead,
+            self.move_info_visits,
+            self.move_info_winrate,
+        )
+        return {
+            'turnNumber': int(self.move[i]),
+            'rootInfo': {
+                'currentPlayer': str(self.player[i]),
+                'visits': int(self.root_visits[i]),
+            },
+            'policy': self.search_policy[i].tolist(),
+            'ownership': dict(zip(coordinates, self.ownership[i].tolist())),
+            'moveInfos': [
+                {
+                    'isSymmetryOf': None if symmetry_of < 0 else coordinates[symmetry_of],
+                    'move': coordinates[move],
+                    'order': order,
+                    'prior': prior,
+                    'scoreLead': score_lead,
+                    'visits': visits,
+                    'winrate': winrate,
+                } for symmetry_of, move, order, prior, score_lead, visits, winrate in zip(
+                    *(column[start:end].tolist() for column in columns)
+                )
+            ]
+        }
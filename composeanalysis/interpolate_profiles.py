@@ -0,0 +1,36 @@
+from typing import Dict, List
+
+import numpy as np
+
+from katago import HumanProfile
+
+
+def interpolate_profiles(
+    turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]],
+    human_profiles: List[HumanProfile]
+) -> Dict[int, List[HumanProfile]]:
+    # Fills in every profile that was not measured at a turn by blending the nearest measured profiles on either side of
+    # it in the rank ladder, weighted by distance.  Returns the profiles that were filled in at each turn.
+    turn_to_interpolated: Dict[int, List[HumanProfile]] = {}
+    for turn, policies in turn_to_profile_to_policy.items():
+        measured = [i for i, p in enumerate(human_profiles) if p in policies]
+        interpolated: List[HumanProfile] = []
+        for i, human_profile in enumerate(human_profiles):
+            if human_profile in policies:
+                continue
+
+            lower = max((j for j in measured if j < i), default=None)
+            upper = min((j for j in measured if j > i), default=None)
+            if lower is None or upper is None:
+                policies[human_profile] = policies[human_profiles[upper if lower is None else lower]].copy()
+            else:
+                weight = (i - lower) / (upper - lower)
+                below = policies[human_profiles[lower]]
+                above = policies[human_profiles[upper]]
+                policies[human_profile] = ((1. - weight) * below + weight * above).astype(np.float32)
+            interpolated.append(human_profile)
+
+        if interpolated:
+            turn_to_interpolated[turn] = interpolated
+
+    return turn_to_interpolated
@@ -0,0 +1,7 @@
+from typing import List
+
+from katago.query import MoveDTO
+
+
+def is_subject_turn(moves: List[MoveDTO], subject: str, turn: int) -> bool:
+    return turn < len(moves) and moves[turn].player.value == subject
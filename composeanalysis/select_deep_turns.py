@@ -0,0 +1,43 @@
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from composeanalysis.compose_rows import compose_rows
+from katago import HumanProfile
+from katago.response import SuccessResponse
+
+
+def select_deep_turns(
+    search_responses: List[SuccessResponse],
+    turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]],
+    position_count: int,
+    size: int,
+    sgf: List[Dict],
+    configuration: Dict,
+    subject: Optional[str] = None
+) -> Set[int]:
+    # Compose the rows a shallow search supports, then pick out the moves whose scoring could change with a deeper one.
+    # Both positions around such a move get the full search, since its loss is the difference between their leads.  When
+    # only one player is reviewed, the opponent's moves keep their shallow search.
+    lead_drop = configuration['accuracy']['lead_drop']
+    winrate_drop = configuration['accuracy']['winrate_drop']
+    adaptive = configuration['adaptive']
+    decided_winrate = adaptive['decided_winrate']
+    favorite_share = adaptive['favorite_share']
+    lead_margin = adaptive['lead_margin']
+    winrate_margin = adaptive['winrate_margin']
+
+    analysis = compose_rows(search_responses, turn_to_profile_to_policy, position_count, size, sgf, configuration)
+    reviewed = np.ones(len(analysis), dtype=bool) if subject is None else analysis.player == subject
+
+    win_rates = np.stack([analysis.prior_win_rate, analysis.posterior_win_rate])
+    decided = np.all((win_rates >= decided_winrate) | (win_rates <= 1. - decided_winrate), axis=0)
+
+    # A favorite that drew few of the visits may not be the move a deeper search prefers.
+    uncertain = (
+        (np.abs(analysis.loss - lead_drop) <= lead_margin) |
+        (np.abs(analysis.drop - winrate_drop) <= winrate_margin) |
+        (analysis.best_search < favorite_share * analysis.root_visits)
+    )
+    moves = analysis.move[reviewed & ~decided & uncertain]
+    return {int(turn) for turn in np.concatenate([moves - 1, moves])}
@@ -0,0 +1,45 @@
+from typing import Dict, List
+
+import numpy as np
+
+from composeanalysis.coordinate_labels import coordinate_labels
+from katago import HumanProfile
+from katago.query import MoveDTO
+
+
+def select_fine_profiles(
+    turn_to_profile_to_policy: Dict[int, Dict[HumanProfile, np.ndarray]],
+    moves: List[MoveDTO],
+    size: int,
+    human_profiles: List[HumanProfile],
+    measured: List[HumanProfile],
+    threshold: float
+) -> Dict[HumanProfile, List[int]]:
+    # Estimate each player's posterior over the measured profiles the same way GoStudy does over all of them: the
+    # product of the likelihoods of the moves they played.  Every unmeasured profile between two measured ones is then
+    # worth measuring on that player's turns if either neighbor carries at least the threshold probability.
+    player_turns: Dict[str, List[int]] = {}
+    for turn in sorted(turn_to_profile_to_policy):
+        player_turns.setdefault(moves[turn].player.value, []).append(turn)
+
+    index = {label: i for i, label in enumerate(coordinate_labels(size))}
+    ladder = [p for p in human_profiles if p in measured]
+    fine: Dict[HumanProfile, List[int]] = {}
+    for turns in player_turns.values():
+        log_likelihoods = np.zeros(len(ladder))
+        for turn in turns:
+            played = index[moves[turn].move.value]
+            policies = turn_to_profile_to_policy[turn]
+            log_likelihoods += np.log([max(float(policies[p][played]), 1e-12) for p in ladder])
+        posterior = np.exp(log_likelihoods - log_likelihoods.max())
+        posterior /= posterior.sum()
+
+        for i in range(len(ladder) - 1):
+            if posterior[i] < threshold and posterior[i + 1] < threshold:
+                continue
+            lower = human_profiles.index(ladder[i])
+            upper = human_profiles.index(ladder[i + 1])
+            for human_profile in human_profiles[lower + 1:upper]:
+                fine.setdefault(human_profile, []).extend(turns)
+
+    return {p: sorted(turns) for p, turns in fine.items()}
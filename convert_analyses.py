@@ -0,0 +1,45 @@
+import os
+import shutil
+import sys
+from glob import glob
+
+from analysisfile.analysis_archive import ANALYSIS_EXTENSION, load_game_analysis, save_game_analysis
+from analysisfile.analysis_csv import read_analysis_csv, write_analysis_csv
+
+# The files that live beside an analysis and are named after it.
+SIDECAR_SUFFIXES = ('.checkpoint', '.progress', '.subject')
+
+
+def convert(source: str):
+    # CSVs are migrated to the binary format and binary analyses are exported as CSVs.  The source is left in place.
+    root, extension = os.path.splitext(source)
+    if extension == '.csv':
+        target = root + ANALYSIS_EXTENSION
+        try:
+            analysis = read_analysis_csv(source)
+        except (KeyError, ValueError) as e:
+            print(f'Skipped: {e}')
+            return
+        save_game_analysis(target, analysis)
+    else:
+        target = root + '.csv'
+        write_analysis_csv(target, load_game_analysis(source))
+
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(source + suffix):
+            shutil.copyfile(source + suffix, target + suffix)
+    print(f'Converted {source} to {target} .')
+
+
+if __name__ == '__main__':
+    filenames = []
+    for target in sys.argv[1:]:
+        if os.path.isdir(target):
+            filenames.extend(sorted(glob(os.path.join(target, '**', '*.csv'), recursive=True)))
+        elif os.path.isfile(target):
+            filenames.append(target)
+        else:
+            print(f'ERROR! Received a path that does not exist: {target}')
+
+    for filename in filenames:
+        convert(filename)
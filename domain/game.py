@@ -48,7 +48,7 @@ class Game:
 
                 # TODO: THIS GETS CALLED TWO DIFFERENT WAYS?!
                 self._handicap_stones = set()
-                for coordinate in self._handicap_stones:
+                for coordinate in handicap_stones:
                     if isinstance(coordinate, str):
                         coordinate = Coordinate[coordinate]
 
@@ -141,8 +141,6 @@ class Game:
             else:
                 self._ko_ended = False
 
-            print(f'{self._turn_counter} {self._ko_capture} {self._ko_ended}')
-
         self._board.lock()
 
     def _process_board(self):
@@ -2,7 +2,6 @@ import functools
 import re
 from collections import OrderedDict, Counter
 
-import jsons
 import math
 import os
 import sys
@@ -13,9 +12,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 
+from analysisfile.analysis_archive import load_game_analysis
+from composeanalysis.game_analysis import POLICY_COLUMNS
 from damage import calculate_damage
 from katago import Engine
-from main import load_configuration, prep_katago, load_sgf, get_or_create_analysis_file
+from main import load_configuration, prep_katago, load_sgf, get_or_create_analysis_file, read_subject_marker
 from parse import parse_sgf_contents
 from plot import _set_matplotlib_fonts
 
@@ -56,39 +57,6 @@ ratings = [
     'Pro',
     'AI'
 ]
-policies = [
-    '20k Policy',
-    '19k Policy',
-    '18k Policy',
-    '17k Policy',
-    '16k Policy',
-    '15k Policy',
-    '14k Policy',
-    '13k Policy',
-    '12k Policy',
-    '11k Policy',
-    '10k Policy',
-    '9k Policy',
-    '8k Policy',
-    '7k Policy',
-    '6k Policy',
-    '5k Policy',
-    '4k Policy',
-    '3k Policy',
-    '2k Policy',
-    '1k Policy',
-    '1d Policy',
-    '2d Policy',
-    '3d Policy',
-    '4d Policy',
-    '5d Policy',
-    '6d Policy',
-    '7d Policy',
-    '8d Policy',
-    '9d Policy',
-    'Pro Policy',
-    'AI Policy'
-]
 all_columns = [*ratings]
 all_columns.insert(0, 'Player')
 
@@ -185,20 +153,11 @@ class Statistics:
         return result + f' ± {self.std:0.2f}'
 
 
-def interpret(row):
-    for column in row.index:
-        read = row[column]
-        x = jsons.loads(read, dict)
-        row[column] = x
-    return row
-
-
-def process_row(row):
+def process_row(row, policy_maxima: Dict[str, float]):
     rating_subset = row[ratings]
-    policy_subset = interpret(row[policies])
 
     likelihoods = [rating_subset[r] for r in ratings]
-    max_likelihoods = [None if r == 'Random' else max((policy_subset[r + ' Policy']).values()) for r in ratings]
+    max_likelihoods = [None if r == 'Random' else policy_maxima[r] for r in ratings]
     accuracies = [None if m is None else l / m for l, m in zip(likelihoods, max_likelihoods)]
 
     total = row[ratings].sum()
@@ -343,26 +302,62 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
     configuration = load_configuration()
     prep_katago(configuration['katago'])
     game, black_name, white_name, size, winner = load_sgf(sgf_filename)
-    analysis_filename = get_or_create_analysis_file(sgf_filename, configuration, game)
 
+    # In progressive mode, every provisional analysis gets reviewed as soon as it is published, so a usable review exists
+    # long before KataGo has spent its full search budget.  Each refresh overwrites the previous review.
+    # A subject-only analysis only gets its subject's marker once it is final, so provisional ones are told here.
+    reviewed = resolve_subject(subject, black_name, white_name) if configuration.get('subject_only') else None
+
+    def on_refresh(provisional_filename: str):
+        print('Reviewing the provisional analysis...')
+        review(sgf_filename, provisional_filename, subject, n, black_name, white_name, reviewed)
+
+    analysis_filename = get_or_create_analysis_file(
+        sgf_filename,
+        configuration,
+        game,
+        on_refresh if configuration.get('progressive') else None,
+        resolve_subject(subject, black_name, white_name)
+    )
+    review(sgf_filename, analysis_filename, subject, n, black_name, white_name, reviewed)
+
+
+def resolve_subject(subject: Optional[str], black_name: str, white_name: str) -> Optional[str]:
+    if subject is None:
+        return None
+    if subject == black_name or subject == 'B':
+        return 'B'
+    if subject == white_name or subject == 'W':
+        return 'W'
+    return None
+
+
+def review(
+    sgf_filename: str,
+    analysis_filename: str,
+    subject: Optional[str],
+    n: int,
+    black_name: str,
+    white_name: str,
+    reviewed: Optional[str] = None
+):
     # Determine the player of interest.
-    player_of_interest = 'both'
-    if subject is not None:
-        if subject == black_name or subject == 'B':
-            player_of_interest = 'B'
-            print(f'Reviewing for Black ({black_name}).')
-        elif subject == white_name or subject == 'W':
-            player_of_interest = 'W'
-            print(f'Reviewing for White ({white_name}).')
-        else:
-            print('Unrecognized subject, reviewing for both players.')
+    player_of_interest = resolve_subject(subject, black_name, white_name) or 'both'
+    if player_of_interest == 'B':
+        print(f'Reviewing for Black ({black_name}).')
+    elif player_of_interest == 'W':
+        print(f'Reviewing for White ({white_name}).')
+    elif subject is not None:
+        print('Unrecognized subject, reviewing for both players.')
     else:
         print('No subject specified, reviewing for both players.')
 
     # Load the analysis file.
     print('Reading analysis file...')
-    df = pd.read_csv(analysis_filename)
+    analysis = load_game_analysis(analysis_filename)
+    df = analysis.frame()
     rating_df = df[all_columns]
+    reviewed = reviewed or read_subject_marker(analysis_filename)
 
     # Load the SGF.
     print('Reading SGF...')
@@ -375,7 +370,22 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
     player_stats = {}
     player_rating_probabilities = {}
     for player in ('B', 'W'):
-        player_subset = rating_df[rating_df['Player'] == player][ratings]
+        # A subject-only analysis has no human policies for the opponent, so there is no performance to assess.  Any
+        # other missing policy means the analysis is broken, and leaving it out would skew the rating posterior.
+        player_rows = rating_df['Player'] == player
+        player_subset = rating_df[player_rows][ratings]
+        if reviewed is not None and player != reviewed:
+            print(f'- {black_name if player == "B" else white_name} ({player}): not analyzed')
+            player_rating_probabilities[player] = pd.Series(0., index=ratings)
+            continue
+        incomplete = player_subset.isna().any(axis=1)
+        if incomplete.any():
+            moves = ', '.join(str(m) for m in df['Move'][player_rows][incomplete])
+            raise ValueError(
+                f'{analysis_filename} is missing human policies for {player} at moves {moves}.  Delete it to rerun the '
+                f'analysis.'
+            )
+
         natural_log = np.log(player_subset)
         sums = natural_log.sum(axis=0)
         offset = np.max(sums)
@@ -473,7 +483,7 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
         player = row['Player']
         played = row['Played']
         favorite = row['Best']
-        search = jsons.loads(row['Search'])
+        search = analysis.search(i - 1)
 
         prior_lead = row['Prior Lead']
         posterior_lead = row['Posterior Lead']
@@ -503,11 +513,13 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
         current_breakdown.update([quality])
 
         # Determine the move's level in reference to the player's performance.
+        if player not in player_stats:
+            continue
         player_statistics = player_stats[player]
         level = player_statistics.level
         if level == 'Random':
             level = '20k'  # correct so that beginners can at least start learning some sensible moves
-        at_level_policy = jsons.loads(row[f'{level} Policy'])
+        at_level_policy = analysis.policy(i - 1, level)
 
         # Preprocess the moves using the isSymmetryOf field.
         symmetries = {}
@@ -553,7 +565,7 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
         expected_loss /= seen_likelihood  # normalize for the moves that were actually processed
 
         # Find the rating intervals that are most likely to have played this move.
-        analysis_df = process_row(row)
+        analysis_df = process_row(row, dict(zip(POLICY_COLUMNS, np.max(analysis.policies[i - 1], axis=1).tolist())))
         max_posterior_probability = analysis_df['Posterior Probability'].max()
         cutoff = min(1 / 32, max_posterior_probability - 0.005)
         most_likely_range_indices = analysis_df['Posterior Probability'] >= cutoff
@@ -661,7 +673,7 @@ def run(sgf_filename: str, subject: Optional[str], n: int):
             else:
                 recommendation_level = level
 
-            recommendation_policy = jsons.loads(row[f'{recommendation_level} Policy'])
+            recommendation_policy = analysis.policy(i - 1, recommendation_level)
             candidates = [
                 (mi, recommendation_policy['pass' if mi['move'].lower() == 'pass' else mi['move']])
                 for mi in search['moveInfos']
@@ -774,7 +786,8 @@ MOST LIKELY RATINGS (Range {most_likely_range_groups}):
             f'> - Move #{x.i}: {x.heading[2:-2].title()}, Relative Loss {x.relative_loss:0.2f}' for x in moves_to_study
         )
 
-        comment = f'''{player} Performance Level: {player_stats[player].label}\n'''
+        label = player_stats[player].label if player in player_stats else 'not analyzed'
+        comment = f'''{player} Performance Level: {label}\n'''
         if player_of_interest == 'both' or player_of_interest == player:
             comment += f'''> Recommended Study:
 {recommended_to_study}
@@ -805,7 +818,8 @@ MOST LIKELY RATINGS (Range {most_likely_range_groups}):
     for player in ('B', 'W'):
         distribution = player_breakdown[player]
         amount = distribution.total()
-        summary += f'{player} Performance Level: {player_stats[player].label}\n{player} Distribution:\n'
+        label = player_stats[player].label if player in player_stats else 'not analyzed'
+        summary += f'{player} Performance Level: {label}\n{player} Distribution:\n'
         for k, v in loss_levels.items():
             summary += f'> {distribution[k]} — {k} ({v}) — {100 * distribution[k] / amount:0.1f}%\n'
         summary += '\n'
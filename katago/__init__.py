@@ -1,7 +1,13 @@
 from .shared import *
 
+from .fakeengineconfiguration import FakeEngineConfiguration
 from .launchconfiguration import LaunchConfiguration
+from .metrics import EngineMetrics
+from .queryhandle import QueryHandle
 from .engine import Engine
+from .enginepool import EnginePool
+from .remoteengine import RemoteEngine
+from .asyncengine import AsyncEngine
 
 import katago.query
 import katago.response
\ No newline at end of file
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from katago import LaunchConfiguration
+from katago.query import Query
+from katago.response import SuccessResponse, parse_success_response
+
+# KataGo writes one JSON object per line, and a line carrying ownership and policy arrays easily exceeds asyncio's default
+# 64 KiB stream limit.
+_STREAM_LIMIT = 1 << 24
+
+
+class AsyncEngine:
+    def __init__(self, launch_config: LaunchConfiguration, output: bool = False):
+        self._launch_config: LaunchConfiguration = launch_config
+        self._output: bool = output
+        self._version: Optional[str] = None
+
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._queries: Dict[str, Tuple[asyncio.Queue, int]] = {}
+        self._readers: List[asyncio.Task] = []
+        self._ready: asyncio.Event = asyncio.Event()
+
+    async def __aenter__(self) -> 'AsyncEngine':
+        return await self.start()
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    @property
+    def version(self) -> str:
+        if not self._version:
+            raise Exception('KataGo has not produced its version number line yet.')
+        return self._version
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    async def start(self) -> 'AsyncEngine':
+        if self._output:
+            print('#  Launching KataGo...')
+
+        arguments = self._launch_config.launch_arguments
+        print(f'# KataGo launch script: {" ".join(arguments)}')
+        self._process = await asyncio.create_subprocess_exec(
+            *arguments,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=_STREAM_LIMIT,
+        )
+        self._readers = [
+            asyncio.create_task(self._read_errors()),
+            asyncio.create_task(self._read_outputs()),
+        ]
+
+        # Do not wait forever if KataGo dies during startup (e.g. a bad model path).
+        ready = asyncio.create_task(self._ready.wait())
+        await asyncio.wait([ready, self._readers[0]], return_when=asyncio.FIRST_COMPLETED)
+        if not self._ready.is_set():
+            ready.cancel()
+            raise RuntimeError('KataGo exited before it was ready to accept inputs.')
+
+        if self._output:
+            print('#  KataGo is ready to accept inputs.')
+        return self
+
+    async def _read_errors(self):
+        while True:
+            raw = await self._process.stderr.readline()
+            if not raw:
+                break
+
+            line = raw.decode('utf-8').rstrip()
+            if self._version is None and line.startswith('KataGo v'):
+                self._version = line[8:]
+            elif not self._ready.is_set() and line.endswith('Started, ready to begin handling requests'):
+                self._ready.set()
+            elif self._output:
+                print(f'#  ERR read: {line}')
+
+    async def _read_outputs(self):
+        while True:
+            raw = await self._process.stdout.readline()
+            if not raw:
+                break
+
+            line = raw.decode('utf-8').rstrip()
+            if not line:
+                continue
+            if self._output:
+                print(f'#  OUT read: {line}')
+
+            try:
+                response = parse_success_response(line)
+            except Exception:
+                if not self._output:
+                    print(f'#  KataGo wrote a message that is not a success response: {line}')
+                continue
+
+            entry = self._queries.get(response.id)
+            if entry is not None:
+                entry[0].put_nowait(response)
+
+        # KataGo's output has closed.  Wake every consumer so none of them waits on a process that no longer exists.
+        for queue, _ in self._queries.values():
+            queue.put_nowait(None)
+
+    async def write_query(self, query: Query) -> str:
+        if not self._ready.is_set():
+            raise RuntimeError('KataGo is not ready.')
+
+        query.id = str(uuid.uuid4())
+        expected = len(query.analyze_turns) if query.analyze_turns else 1
+        self._queries[query.id] = (asyncio.Queue(), expected)
+
+        command: str = query.to_json() + os.linesep
+        self._process.stdin.write(command.encode('utf-8'))
+        await self._process.stdin.drain()
+        if self._output:
+            print(f'# Passed query to KataGo: {command}')
+        return query.id
+
+    async def responses(self, query_id: str) -> AsyncIterator[SuccessResponse]:
+        queue, expected = self._queries[query_id]
+        delivered = 0
+        try:
+            while delivered < expected:
+                response: Optional[SuccessResponse] = await queue.get()
+                if response is None:
+                    raise RuntimeError(f'KataGo exited before it finished query {query_id}.')
+                if not response.is_during_search:
+                    delivered += 1
+                yield response
+        finally:
+            del self._queries[query_id]
+
+    async def analyze(self, query: Query) -> AsyncIterator[SuccessResponse]:
+        query_id = await self.write_query(query)
+        async for response in self.responses(query_id):
+            yield response
+
+    async def close(self):
+        if self._output:
+            print('#  AsyncEngine::close() called...')
+        if self._process is not None and self._process.returncode is None:
+            self._process.stdin.close()
+            self._process.kill()
+            await self._process.wait()
+        for reader in self._readers:
+            reader.cancel()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+        if self._output:
+            print('#  AsyncEngine::close() call complete.')
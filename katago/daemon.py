@@ -0,0 +1,136 @@
+import json
+import os
+import socket
+import socketserver
+from concurrent.futures import CancelledError
+from queue import Full, Queue
+from threading import Event, Thread
+from typing import Callable, Dict, Optional
+
+from katago.engine import Engine
+from katago.enginepool import EnginePool
+from katago.queryhandle import QueryHandle
+
+# How many responses may wait for a client to read them before it is cut off.  The engine's reader hands responses to
+# every client, so one that stops reading must not hold up the others.
+_CLIENT_BACKLOG = 1024
+
+
+class _ClientHandler(socketserver.StreamRequestHandler):
+    # Each connection speaks KataGo's own analysis protocol: one JSON query per line in, one JSON response per line out.
+    # The daemon swaps each query's id for one of the engine's own so that concurrent clients can never collide, then
+    # restores the client's id on every response it forwards.  Responses are queued for the connection's own writer
+    # thread, and a client that falls more than _CLIENT_BACKLOG responses behind is disconnected.
+    def handle(self):
+        engine: Engine | EnginePool = self.server.engine
+        outbox: Queue[Optional[str]] = Queue(maxsize=_CLIENT_BACKLOG)
+        cut_off = Event()
+
+        def send(line: str):
+            if cut_off.is_set():
+                raise ConnectionAbortedError('The client was disconnected.')
+            try:
+                outbox.put_nowait(line)
+            except Full:
+                cut_off.set()
+                print(f'#  A daemon client fell {_CLIENT_BACKLOG} responses behind; disconnecting it.')
+                try:
+                    # Wakes the loop below, which then cancels the client's queries.
+                    self.request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                raise ConnectionAbortedError('The client fell too far behind.')
+
+        def drain():
+            while True:
+                line = outbox.get()
+                if line is None:
+                    return
+                try:
+                    self.wfile.write((line + '\n').encode('utf-8'))
+                    self.wfile.flush()
+                except (OSError, ValueError):
+                    cut_off.set()
+                    return
+
+        writer = Thread(target=drain)
+        writer.daemon = True
+        writer.start()
+
+        # Maps each of this client's query ids to the id the engine knows it by, so terminate actions can be translated.
+        submitted: Dict[str, str] = {}
+
+        send(json.dumps({'version': engine.version}))
+        try:
+            for raw in self.rfile:
+                line = raw.decode('utf-8').strip()
+                if not line:
+                    continue
+
+                try:
+                    payload = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f'#  Daemon received a line that is not JSON: {line}')
+                    continue
+
+                action = payload.get('action')
+                if action == 'terminate':
+                    engine_id = submitted.pop(payload.get('terminateId'), None)
+                    if engine_id is not None:
+                        engine.cancel(engine_id)
+                elif action == 'terminate_all':
+                    _cancel_all(engine, submitted)
+                else:
+                    client_id = payload.get('id')
+                    handle = engine.submit_raw(payload)
+                    submitted[client_id] = payload['id']
+                    handle.add_done_callback(lambda _, c=client_id: submitted.pop(c, None))
+                    forwarder = Thread(target=_forward, args=(handle, client_id, send))
+                    forwarder.daemon = True
+                    forwarder.start()
+        except OSError:
+            pass  # the client reset the connection, or was cut off for falling behind
+        finally:
+            # A client that disconnects mid-analysis (e.g. an aborted run) frees its share of KataGo for everyone else.
+            _cancel_all(engine, submitted)
+            try:
+                outbox.put_nowait(None)
+            except Full:
+                pass  # the writer fails on the closed connection instead
+
+
+def _cancel_all(engine: Engine | EnginePool, submitted: Dict[str, str]):
+    for engine_id in list(submitted.values()):
+        engine.cancel(engine_id)
+    submitted.clear()
+
+
+def _forward(handle: QueryHandle, client_id: Optional[str], send: Callable[[str], None]):
+    try:
+        for response in handle:
+            response.id = client_id
+            send(response.to_json())
+    except (OSError, CancelledError):
+        # The client went away, or the query was terminated or ran past its deadline.  Remaining responses are dropped.
+        pass
+
+
+class EngineDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, engine: Engine | EnginePool, socket_path: str):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # a stale socket left behind by a daemon that did not shut down cleanly
+        super().__init__(socket_path, _ClientHandler)
+        self.engine: Engine | EnginePool = engine
+        self.socket_path: str = socket_path
+
+    def serve(self):
+        print(f'KataGo daemon listening on {self.socket_path} .')
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self.engine.kill()
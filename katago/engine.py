@@ -1,103 +1,216 @@
 import io
+import json
 import os
 import subprocess
+import time
 import uuid
-from threading import Thread
-from typing import Optional, Dict, List, Set
+from threading import Event, Lock, Thread
+from typing import Any, Optional, Dict, List, Set, Tuple
 
 from katago import LaunchConfiguration
 from katago.linetype import LineType
-from katago.query import Query
+from katago.metrics import EngineMetrics
+from katago.query import Query, QueryEncoder
+from katago.queryhandle import QueryHandle
 from katago.response import *
-from katago.shared import str_to_enum
+
+# KataGo reports these on stderr when it hits an error it cannot recover from.  It may not exit afterwards (a wedged GPU
+# can leave it hanging), so it is killed and treated as a crash.
+_FATAL_ERRORS = ('Uncaught exception', 'terminate called after throwing')
 
 
 class Engine:
-    def __init__(self, launch_config: LaunchConfiguration, output: bool = False):
+    def __init__(
+        self,
+        launch_config: LaunchConfiguration,
+        output: bool = False,
+        metrics: Optional[EngineMetrics] = None
+    ):
         self._launch_config: LaunchConfiguration = launch_config
         self._output: bool = output
         self._version: Optional[str] = None
 
-        self._responses: Dict[str, List[SuccessResponse]] = {}
-        self._ready: bool = False
-        self._used: Set[uuid.UUID] = set()
+        # _routes holds the handle for every query KataGo still owes responses to; the reader thread drops an entry as
+        # soon as its last response arrives.  _handles lets consumers look a query up by id until they have drained it.
+        self._capacity: int = launch_config.response_buffer
+        self._handles: Dict[str, QueryHandle] = {}
+        self._routes: Dict[str, QueryHandle] = {}
+        self._remaining: Dict[str, int] = {}
+        self._costs: Dict[str, int] = {}
+        self._metrics: EngineMetrics = metrics if metrics is not None else EngineMetrics()
+        self._outstanding_work: int = 0
+        self._work_lock: Lock = Lock()
+        self._write_lock: Lock = Lock()
+        self._ready: Event = Event()
+        self._settled: Event = Event()  # set once KataGo is ready, or has exited without getting there
+
+        # Every query KataGo still owes positions to can be resent if KataGo crashes.  _answered holds the turns it has
+        # already finished, and _generation counts the relaunches so a query is never written to both processes.
+        # _restarts counts the relaunches since KataGo last finished a position, across crashes, so that one that keeps
+        # crashing gives up instead of being relaunched forever.
+        self._serialized: Dict[str, str] = {}
+        self._answered: Dict[str, Set[int]] = {}
+        self._generation: int = 0
+        self._restarts: int = 0
+        self._killed: bool = False
+
+        # Everything KataGo reads and writes can be captured for the fake engine to replay later.
+        self._record: Optional[io.TextIOWrapper] = None
+        self._record_lock: Lock = Lock()
+        if launch_config.record_file:
+            self._record = open(launch_config.record_file, 'a', encoding='utf-8')
 
         if self._output:
             print('#  Launching KataGo...')
+        self._launch()
+        if self._output:
+            print(f'#  KataGo has launched.')
 
-        def read_stream(
-            name: str,
-            stream: io.TextIOWrapper,
-            type_: LineType
-        ):
-            if self._output:
-                print(f'#  {name} thread has begun.')
-            while True:
-                line = stream.readline().rstrip()
-                # print(f'# !!! {type_} :: {line}')
-
-                if (
-                    type_ is LineType.error and
-                    self._version is None and
-                    line.startswith('KataGo v')
-                ):
-                    self._version = line[8:]
-                elif (
-                    not self._ready and
-                    type_ is LineType.error and
-                    line.endswith('Started, ready to begin handling requests')
-                ):
-                    self._ready = True
-                    if self._output:
-                        print('#  KataGo is ready to accept inputs.')
-                elif self._ready:
-                    if self._output:
-                        print(f'#  {name} read: {line}')
-                    if line:
-                        if type_ is LineType.output:
-                            try:
-                                response = SuccessResponse.from_json(line)
-
-                                # THERE ARE SOME FIELDS THAT ARE NOT UNMARSHALLED CORRECTLY.  I need to figure this out
-                                # later.  For now, manually fix them  }:|
-                                for mi in response.move_infos:
-                                    mi.move = str_to_enum(mi.move)
-                                    mi.pv = [str_to_enum(x) for x in mi.pv]
-
-                                if response.id in self._responses:
-                                    self._responses[response.id].append(response)
-                                else:
-                                    self._responses[response.id] = [response]
-                            except Exception:
-                                # We already have the message if output is configured on.
-                                if not self._output:
-                                    print(f'#  KataGo wrote a message that is not a success response: {line}')
-                    else:
-                        if self._output:
-                            print(f'#  {name} thread has finished.')
-                        break
-
-        launch_script = launch_config.launch_script
+    def _launch(self) -> Tuple[subprocess.Popen, Event, Event]:
+        # Each process gets its own reader threads.  `started` is set once it is ready to handle requests, and `settled`
+        # once it is ready or has exited without getting there.
+        launch_script = self._launch_config.launch_script
         print(f'# KataGo launch script: {launch_script}')
-        self._process = subprocess.Popen(
-            launch_script,
+        process = subprocess.Popen(
+            self._launch_config.launch_arguments,
             stderr=subprocess.PIPE,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
         )
+        self._process = process
 
-        stderr = io.TextIOWrapper(self._process.stderr, encoding='utf-8', errors='strict')
-        self._errors: Thread = Thread(target=read_stream, args=('ERR', stderr, LineType.error))
-        self._errors.daemon = True
-        self._errors.start()
-
-        stdout = io.TextIOWrapper(self._process.stdout, encoding='utf-8', errors='strict')
-        self._outputs: Thread = Thread(target=read_stream, args=('OUT', stdout, LineType.output))
-        self._outputs.daemon = True
-        self._outputs.start()
+        started = Event()
+        settled = Event()
+        for name, stream, type_ in (
+            ('ERR', process.stderr, LineType.error),
+            ('OUT', process.stdout, LineType.output),
+        ):
+            reader = Thread(
+                target=self._read_stream,
+                args=(name, io.TextIOWrapper(stream, encoding='utf-8', errors='strict'), type_, process, started, settled)
+            )
+            reader.daemon = True
+            reader.start()
+        return process, started, settled
 
+    def _read_stream(
+        self,
+        name: str,
+        stream: io.TextIOWrapper,
+        type_: LineType,
+        process: subprocess.Popen,
+        started: Event,
+        settled: Event
+    ):
         if self._output:
-            print(f'#  KataGo has launched.')
+            print(f'#  {name} thread has begun.')
+        while True:
+            raw = stream.readline()
+            if not raw:
+                # KataGo has exited, whether or not it ever got ready.
+                if self._output:
+                    print(f'#  {name} thread has finished.')
+                if type_ is LineType.output:
+                    settled.set()
+                    self._exited(process, started)
+                break
+
+            line = raw.rstrip()
+            # print(f'# !!! {type_} :: {line}')
+
+            if (
+                type_ is LineType.error and
+                self._version is None and
+                line.startswith('KataGo v')
+            ):
+                self._version = line[8:]
+            elif (
+                not started.is_set() and
+                type_ is LineType.error and
+                line.endswith('Started, ready to begin handling requests')
+            ):
+                started.set()
+                settled.set()
+                self._ready.set()
+                self._settled.set()
+                if self._output:
+                    print('#  KataGo is ready to accept inputs.')
+            elif started.is_set():
+                if self._output:
+                    print(f'#  {name} read: {line}')
+                if type_ is LineType.error and any(error in line for error in _FATAL_ERRORS):
+                    print(f'#  KataGo reported a fatal error: {line}')
+                    if process is self._process and not self._killed:
+                        process.kill()
+                elif line and type_ is LineType.output:
+                    self._record_line('response', line)
+                    try:
+                        decode_start = time.perf_counter()
+                        try:
+                            response = parse_success_response(line)
+                        finally:
+                            self._metrics.line_read(len(raw.encode('utf-8')), time.perf_counter() - decode_start)
+
+                        handle = self._routes.get(response.id)
+                        if handle is not None:
+                            self._metrics.response_received(
+                                response.id,
+                                response.is_during_search,
+                                response.root_info.visits
+                            )
+                            handle.put(response)  # blocks while the consumer is behind
+                        if not response.is_during_search:
+                            self._position_finished(response.id, response.turn_number)
+                    except Exception:
+                        self._read_other_message(line)
+
+    def _exited(self, process: subprocess.Popen, started: Event):
+        if self._killed or process is not self._process or not started.is_set():
+            self._settled.set()  # lets wait_until_ready() give up on a KataGo that never started
+            return
+        self._recover(process)
+
+    def _recover(self, process: subprocess.Popen):
+        # KataGo crashed mid-analysis.  Relaunch it and resend every unfinished query under its own id, minus the turns
+        # already answered, so that the handles waiting on them never notice.  Queries submitted meanwhile wait on the
+        # write lock and then go to the new process.
+        detected = time.monotonic()
+        code = process.wait()
+        max_restarts = self._launch_config.max_restarts
+        error: Optional[BaseException] = None
+        with self._write_lock:
+            while True:
+                if self._restarts >= max_restarts:
+                    error = RuntimeError(
+                        f'KataGo exited with code {code} after {self._restarts} restarts without finishing a position.'
+                    )
+                    break
+                self._restarts += 1
+                print(
+                    f'#  KataGo exited with code {code}; restarting it (attempt {self._restarts} of {max_restarts})...'
+                )
+                process, started, settled = self._launch()
+                settled.wait()
+                if started.is_set():
+                    break
+                code = process.wait()
+
+            if error is None:
+                with self._work_lock:
+                    self._generation += 1
+                    unfinished = [
+                        _resume_query(self._serialized[query_id], self._answered[query_id])
+                        for query_id in self._routes
+                    ]
+                for serialized in unfinished:
+                    self._write_unlocked(serialized)
+                self._metrics.engine_restarted(time.monotonic() - detected)
+                print(f'#  KataGo restarted; {len(unfinished)} unfinished queries were resubmitted.')
+
+        if error is not None:
+            print(f'#  {error}')
+            self.cancel(error=error)
+            self._ready.clear()
 
     @property
     def version(self) -> str:
@@ -107,41 +220,262 @@ class Engine:
 
     @property
     def ready(self):
-        return self._ready
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        self._settled.wait(timeout)
+        return self._ready.is_set()
+
+    @property
+    def outstanding_work(self) -> int:
+        return self._outstanding_work
+
+    @property
+    def metrics(self) -> EngineMetrics:
+        return self._metrics
+
+    def position_cost(self, max_visits: Optional[int]) -> int:
+        playouts = self._launch_config.playouts
+        return min(max_visits, playouts) if max_visits else playouts
 
     def write_query(self, query: Query) -> str:
+        return self.submit(query).id
+
+    def submit(
+        self,
+        query: Query,
+        handle: Optional[QueryHandle] = None,
+        query_id: Optional[str] = None,
+        deadline: Optional[float] = None
+    ) -> QueryHandle:
+        if self._output:
+            print(f'#  KataGo::submit() called...')
+        query.id = query_id or self._next_query_id()
+        expected = len(query.analyze_turns) if query.analyze_turns else 1
+        handle = self._dispatch(query.id, query.to_json(), expected, self.position_cost(query.max_visits), handle)
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def submit_raw(
+        self,
+        payload: Dict[str, Any],
+        handle: Optional[QueryHandle] = None,
+        query_id: Optional[str] = None
+    ) -> QueryHandle:
         if self._output:
-            print(f'#  KataGo::write_query() called...')
-        if not self._ready:
+            print(f'#  KataGo::submit_raw() called...')
+        payload['id'] = query_id or self._next_query_id()
+        turns = payload.get('analyzeTurns')
+        expected = len(turns) if turns else 1
+        cost = self.position_cost(payload.get('maxVisits'))
+        return self._dispatch(payload['id'], json.dumps(payload), expected, cost, handle)
+
+    def submit_batch(
+        self,
+        queries: List[Query],
+        deadline: Optional[float] = None,
+        handle: Optional[QueryHandle] = None,
+        query_ids: Optional[List[str]] = None
+    ) -> QueryHandle:
+        # Every query's responses arrive through one handle, tagged with that query's id.  A consumer draining a single
+        # handle can never wait on one query while the reader thread waits for room in another query's buffer.  A game's
+        # queries share everything but a few fields, so they are encoded together and written to KataGo in one go.
+        if handle is None:
+            expected = sum(len(query.analyze_turns) if query.analyze_turns else 1 for query in queries)
+            handle = QueryHandle(str(uuid.uuid4()), expected, self._capacity)
+        encoder = QueryEncoder()
+        lines: List[Tuple[str, int]] = []
+        for i, query in enumerate(queries):
+            query.id = query_ids[i] if query_ids else self._next_query_id()
+            serialized = encoder.encode(query)
+            expected = len(query.analyze_turns) if query.analyze_turns else 1
+            generation = self._register(query.id, serialized, expected, self.position_cost(query.max_visits), handle)
+            lines.append((serialized, generation))
+        self._write_queries(lines)
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def cancel(self, query_id: Optional[str] = None, error: Optional[BaseException] = None) -> bool:
+        # Terminates a query, or every query when no id is given.  The id of any query in a batch, or of the batch's
+        # handle, terminates the whole batch.  Its work stops counting against this engine immediately so the next query
+        # gets the capacity, and its consumer gets the error (CancelledError by default) instead of further responses.
+        with self._work_lock:
+            if query_id is None:
+                handles = set(self._routes.values())
+            else:
+                handle = self._handles.get(query_id) or self._routes.get(query_id)
+                if handle is None:
+                    handle = next((h for h in self._routes.values() if h.id == query_id), None)
+                if handle is None:
+                    return False
+                handles = {handle}
+
+            terminated = [i for i, h in self._routes.items() if h in handles]
+            for i in terminated:
+                self._outstanding_work -= self._remaining.pop(i) * self._costs.pop(i)
+                del self._routes[i]
+                del self._serialized[i]
+                del self._answered[i]
+                self._metrics.query_finished(i, cancelled=True)
+
+        if query_id is None:
+            self._write({'id': self._next_query_id(), 'action': 'terminate_all'})
+        else:
+            for i in terminated:
+                self._write({'id': self._next_query_id(), 'action': 'terminate', 'terminateId': i})
+
+        for handle in handles:
+            handle.cancel(error)
+        for i in [i for i, h in self._handles.items() if h in handles]:
+            self._handles.pop(i, None)
+        return True
+
+    def _next_query_id(self) -> str:
+        if not self._ready.is_set():
             raise RuntimeError('KataGo is not ready.')
 
-        candidate_id = uuid.uuid4()
-        while candidate_id in self._used:
-            candidate_id = uuid.uuid4()
-        self._used.add(candidate_id)
-        query.id = str(candidate_id)
+        candidate_id = str(uuid.uuid4())
+        while candidate_id in self._routes or candidate_id in self._handles:
+            candidate_id = str(uuid.uuid4())
+        return candidate_id
+
+    def _dispatch(
+        self,
+        query_id: str,
+        serialized: str,
+        expected: int,
+        cost: int,
+        handle: Optional[QueryHandle]
+    ) -> QueryHandle:
+        if handle is None:
+            handle = QueryHandle(query_id, expected, self._capacity)
+        generation = self._register(query_id, serialized, expected, cost, handle)
+        self._write_queries([(serialized, generation)])
+        return handle
+
+    def _register(self, query_id: str, serialized: str, expected: int, cost: int, handle: QueryHandle) -> int:
+        # The handle must be registered before KataGo sees the query so the reader thread cannot drop early responses.
+        self._handles[query_id] = handle
+        handle.add_done_callback(lambda _: self._handles.pop(query_id, None))
 
-        command: str = query.to_json() + os.linesep
+        self._metrics.query_written(query_id)
+        with self._work_lock:
+            self._routes[query_id] = handle
+            self._remaining[query_id] = expected
+            self._costs[query_id] = cost
+            self._serialized[query_id] = serialized
+            self._answered[query_id] = set()
+            self._outstanding_work += expected * cost
+            return self._generation
+
+    def _write_queries(self, queries: List[Tuple[str, int]]):
+        # Queries registered before KataGo was relaunched have already been resent by the recovery.  Each query is
+        # recorded before KataGo can see it, so that no response in the recording precedes its query.
+        with self._write_lock:
+            for serialized, _ in queries:
+                self._record_line('query', serialized)
+            current = [serialized for serialized, generation in queries if generation == self._generation]
+            if current:
+                self._write_unlocked(os.linesep.join(current))
+
+    def _record_line(self, kind: str, serialized: str):
+        if self._record is not None:
+            with self._record_lock:
+                self._record.write(f'{{"{kind}": {serialized}}}\n')
+                self._record.flush()
+
+    def _write(self, payload: Dict[str, Any]):
+        self._write_line(json.dumps(payload))
+
+    def _write_line(self, serialized: str):
+        with self._write_lock:
+            self._write_unlocked(serialized)
+
+    def _write_unlocked(self, serialized: str):
+        command: str = serialized + os.linesep
         encoded: bytes = command.encode('utf-8')
-        self._process.stdin.write(encoded)
-        self._process.stdin.flush()
+        try:
+            self._process.stdin.write(encoded)
+            self._process.stdin.flush()
+        except (OSError, ValueError):
+            # KataGo has exited.  If it is relaunched, every query still owed responses is resent.
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+            if self._output:
+                print(f'# Could not pass query to KataGo: {encoded}')
+            return
         if self._output:
             print(f'# Passed query to KataGo: {encoded}')
-        return query.id
 
-    def next_response(self, query_id: str) -> Optional[SuccessResponse]:
-        response: Optional[SuccessResponse] = None
+    def _position_finished(self, query_id: str, turn_number: int):
+        with self._work_lock:
+            if query_id not in self._remaining:
+                return
 
-        if query_id in self._responses:
-            found = self._responses[query_id]
-            if len(found) > 0:
-                response = found.pop(0)
+            self._outstanding_work -= self._costs[query_id]
+            self._remaining[query_id] -= 1
+            self._answered[query_id].add(turn_number)
+            self._restarts = 0
+            if self._remaining[query_id] <= 0:
+                del self._routes[query_id]
+                del self._remaining[query_id]
+                del self._costs[query_id]
+                del self._serialized[query_id]
+                del self._answered[query_id]
+                self._metrics.query_finished(query_id)
 
-        return response
+    def _read_other_message(self, line: str):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+
+        # A terminated query still produces a final line for each of its positions, but positions KataGo had not started
+        # carry no analysis.  Neither that nor the acknowledgement of the terminate action is worth reporting.
+        if isinstance(message, dict) and (message.get('noResults') or 'action' in message):
+            if not message.get('isDuringSearch', False) and 'turnNumber' in message:
+                self._position_finished(message['id'], message['turnNumber'])
+        elif not self._output:
+            # We already have the message if output is configured on.
+            print(f'#  KataGo wrote a message that is not a success response: {line}')
+
+    def handle(self, query_id: str) -> Optional[QueryHandle]:
+        return self._handles.get(query_id)
+
+    def next_response(
+        self,
+        query_id: str,
+        block: bool = False,
+        timeout: Optional[float] = None
+    ) -> Optional[SuccessResponse]:
+        handle = self._handles.get(query_id)
+        return handle.get(block=block, timeout=timeout) if handle else None
 
     def kill(self):
         if self._output:
             print('#  KataGo::kill() called...')
+        self._killed = True
         self._process.kill()
+        if self._record is not None:
+            with self._record_lock:
+                self._record.close()
+                self._record = None
         if self._output:
             print('#  KataGo::kill() call complete.')
+
+
+def _resume_query(serialized: str, answered: Set[int]) -> str:
+    if not answered:
+        return serialized
+
+    payload = json.loads(serialized)
+    turns = payload['analyzeTurns']
+    kept = [i for i, turn in enumerate(turns) if turn not in answered]
+    payload['analyzeTurns'] = [turns[i] for i in kept]
+    if 'priorities' in payload:
+        payload['priorities'] = [payload['priorities'][i] for i in kept]
+    return json.dumps(payload)
@@ -0,0 +1,220 @@
+import dataclasses
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from katago import LaunchConfiguration
+from katago.engine import Engine
+from katago.metrics import EngineMetrics
+from katago.query import Query
+from katago.queryhandle import QueryHandle
+from katago.response import SuccessResponse
+
+
+class EnginePool:
+    def __init__(
+        self,
+        launch_config: LaunchConfiguration,
+        instances: int,
+        instance_override_config: Optional[List[Dict[str, Union[float, int, str]]]] = None,
+        output: bool = False
+    ):
+        if instances < 1:
+            raise ValueError('instances must be >= 1')
+        if instance_override_config and len(instance_override_config) > instances:
+            raise ValueError('instance_override_config has more entries than there are instances')
+
+        self._launch_config: LaunchConfiguration = launch_config
+        self._handles: Dict[str, QueryHandle] = {}
+        # The instances share one set of metrics, so that a query split across them is counted once.
+        self._metrics: EngineMetrics = EngineMetrics()
+        self._engines: List[Engine] = []
+        for i in range(instances):
+            config = launch_config
+            if instance_override_config and i < len(instance_override_config):
+                override_config = {**(launch_config.override_config or {}), **instance_override_config[i]}
+                config = dataclasses.replace(launch_config, override_config=override_config)
+            self._engines.append(Engine(config, output=output, metrics=self._metrics))
+
+    @property
+    def engines(self) -> List[Engine]:
+        return self._engines
+
+    @property
+    def version(self) -> str:
+        return self._engines[0].version
+
+    @property
+    def ready(self) -> bool:
+        return all(engine.ready for engine in self._engines)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        # Every instance loads its models in parallel, so waiting on them in sequence costs no more than the slowest.
+        return all(engine.wait_until_ready(timeout) for engine in self._engines)
+
+    @property
+    def outstanding_work(self) -> int:
+        return sum(engine.outstanding_work for engine in self._engines)
+
+    @property
+    def metrics(self) -> EngineMetrics:
+        return self._metrics
+
+    def write_query(self, query: Query) -> str:
+        return self.submit(query).id
+
+    def submit(
+        self,
+        query: Query,
+        handle: Optional[QueryHandle] = None,
+        deadline: Optional[float] = None
+    ) -> QueryHandle:
+        # Every instance tags its share of the query's responses with the same id, so consumers never see the split.
+        query_id = self._next_query_id()
+        if handle is None:
+            handle = self._open_handle(query_id, _expected(query.analyze_turns))
+        self._register(query_id, handle)
+
+        distribution = self._distribute(query.analyze_turns, query.max_visits)
+        self._metrics.query_written(query_id, len(distribution))
+        for engine, assigned in distribution:
+            engine.submit(_share(query, assigned), handle=handle, query_id=query_id)
+
+        query.id = query_id
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def submit_raw(self, payload: Dict[str, Any]) -> QueryHandle:
+        query_id = self._next_query_id()
+        handle = self._open_handle(query_id, _expected(payload.get('analyzeTurns')))
+        self._register(query_id, handle)
+
+        distribution = self._distribute(payload.get('analyzeTurns'), payload.get('maxVisits'))
+        self._metrics.query_written(query_id, len(distribution))
+        for engine, assigned in distribution:
+            subpayload = {**payload}
+            if assigned is not None:
+                subpayload['analyzeTurns'] = assigned
+                if payload.get('priorities') is not None:
+                    priority_of = dict(zip(payload['analyzeTurns'], payload['priorities']))
+                    subpayload['priorities'] = [priority_of[turn] for turn in assigned]
+            engine.submit_raw(subpayload, handle=handle, query_id=query_id)
+
+        payload['id'] = query_id
+        return handle
+
+    def submit_batch(self, queries: List[Query], deadline: Optional[float] = None) -> QueryHandle:
+        # The batch is split up front so that each instance receives its whole share in a single write.
+        expected = sum(_expected(query.analyze_turns) for query in queries)
+        handle = self._open_handle(str(uuid.uuid4()), expected)
+        pending = [0] * len(self._engines)
+        shares: Dict[int, Tuple[List[Query], List[str]]] = {}
+        for query in queries:
+            query_id = self._next_query_id()
+            self._register(query_id, handle)
+            distribution = self._distribute(query.analyze_turns, query.max_visits, pending)
+            self._metrics.query_written(query_id, len(distribution))
+            for engine, assigned in distribution:
+                subqueries, query_ids = shares.setdefault(self._engines.index(engine), ([], []))
+                subqueries.append(_share(query, assigned))
+                query_ids.append(query_id)
+            query.id = query_id
+
+        for index, (subqueries, query_ids) in shares.items():
+            self._engines[index].submit_batch(subqueries, handle=handle, query_ids=query_ids)
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def cancel(self, query_id: Optional[str] = None, error: Optional[BaseException] = None) -> bool:
+        # Every instance knows a query's share by the same id, so each one terminates its own part.
+        cancelled = False
+        for engine in self._engines:
+            cancelled = engine.cancel(query_id, error) or cancelled
+
+        if query_id is None:
+            handles = set(self._handles.values())
+        else:
+            handle = self._handles.get(query_id)
+            if handle is None:
+                handle = next((h for h in self._handles.values() if h.id == query_id), None)
+            handles = {handle} if handle is not None else set()
+
+        for handle in handles:
+            handle.cancel(error)
+            cancelled = True
+        for i in [i for i, h in self._handles.items() if h in handles]:
+            self._handles.pop(i, None)
+        return cancelled
+
+    def _next_query_id(self) -> str:
+        if not self.ready:
+            raise RuntimeError('KataGo is not ready.')
+
+        candidate_id = str(uuid.uuid4())
+        while candidate_id in self._handles:
+            candidate_id = str(uuid.uuid4())
+        return candidate_id
+
+    def _open_handle(self, handle_id: str, expected: int) -> QueryHandle:
+        return QueryHandle(handle_id, expected, self._launch_config.response_buffer)
+
+    def _register(self, query_id: str, handle: QueryHandle):
+        self._handles[query_id] = handle
+        handle.add_done_callback(lambda _: self._handles.pop(query_id, None))
+
+    def _distribute(
+        self,
+        analyze_turns: Optional[List[int]],
+        max_visits: Optional[int],
+        pending: Optional[List[int]] = None
+    ) -> List[Tuple[Engine, Optional[List[int]]]]:
+        # `pending` carries the work already assigned to each instance but not yet submitted, and is updated in place.
+        pending = pending if pending is not None else [0] * len(self._engines)
+        projected = [engine.outstanding_work + extra for engine, extra in zip(self._engines, pending)]
+        if not analyze_turns:
+            # KataGo analyzes only the final position of a query without analyzeTurns, so it cannot be split.
+            index = min(range(len(self._engines)), key=lambda i: projected[i])
+            pending[index] += self._engines[index].position_cost(max_visits)
+            return [(self._engines[index], None)]
+
+        # Greedily give each turn to the instance with the least projected work.  Positions of one query cost the same,
+        # so this also interleaves a game's turns across the instances instead of handing each one a contiguous block.
+        assignments: List[List[int]] = [[] for _ in self._engines]
+        for turn in analyze_turns:
+            index = min(range(len(self._engines)), key=lambda i: projected[i])
+            assignments[index].append(turn)
+            cost = self._engines[index].position_cost(max_visits)
+            projected[index] += cost
+            pending[index] += cost
+
+        return [(engine, assigned) for engine, assigned in zip(self._engines, assignments) if assigned]
+
+    def handle(self, query_id: str) -> Optional[QueryHandle]:
+        return self._handles.get(query_id)
+
+    def next_response(
+        self,
+        query_id: str,
+        block: bool = False,
+        timeout: Optional[float] = None
+    ) -> Optional[SuccessResponse]:
+        handle = self._handles.get(query_id)
+        return handle.get(block=block, timeout=timeout) if handle else None
+
+    def kill(self):
+        for engine in self._engines:
+            engine.kill()
+
+
+def _share(query: Query, assigned: Optional[List[int]]) -> Query:
+    # Per-turn priorities follow their turns to whichever instance analyzes them.
+    priorities = query.priorities
+    if priorities is not None and assigned is not None:
+        priority_of = dict(zip(query.analyze_turns, priorities))
+        priorities = [priority_of[turn] for turn in assigned]
+    return dataclasses.replace(query, analyze_turns=assigned, priorities=priorities)
+
+
+def _expected(analyze_turns: Optional[List[int]]) -> int:
+    return len(analyze_turns) if analyze_turns else 1
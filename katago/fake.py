@@ -0,0 +1,392 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from itertools import count
+from queue import PriorityQueue
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# A stand-in for `katago analysis` that speaks the same stdin/stdout JSON protocol, so everything downstream of the engine
+# can be run, benchmarked and profiled on machines without KataGo or a GPU.  It either replays responses recorded from a
+# real KataGo (see LaunchConfiguration.record_file) or synthesizes plausible, deterministic ones.
+#
+# This file is launched as a standalone script, so it must not import anything from this repository.
+#
+#     python katago/fake.py analysis [KataGo's own arguments...] [-latency SECONDS] [-replay FILE] [-seed N]
+#         [-crash-after POSITIONS] [-fail-after POSITIONS]
+
+VERSION = '1.16.0-fake'
+COLUMNS = 'ABCDEFGHJKLMNOPQRSTUVWXYZ'
+
+# The fields that decide what a query's responses look like.  A recorded query replays for any query that matches on all.
+KEY_FIELDS = (
+    'boardXSize', 'boardYSize', 'rules', 'komi', 'moves', 'initialStones', 'initialPlayer', 'maxVisits',
+    'overrideSettings', 'includeOwnership', 'includePolicy',
+)
+
+
+def query_key(query: Dict[str, Any]) -> str:
+    return json.dumps({k: query.get(k) for k in KEY_FIELDS}, sort_keys=True)
+
+
+def load_replay(filename: str) -> Dict[str, Dict[int, List[Dict[str, Any]]]]:
+    # The recording interleaves {"query": ...} lines with {"response": ...} lines in the order the engine saw them.
+    queries: Dict[str, str] = {}
+    replay: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+    with open(filename, 'r', encoding='utf-8') as infile:
+        for line in infile:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'query' in entry:
+                query = entry['query']
+                queries[query['id']] = query_key(query)
+            elif 'response' in entry:
+                response = entry['response']
+                key = queries.get(response.get('id'))
+                if key is not None and 'turnNumber' in response:
+                    replay.setdefault(key, {}).setdefault(response['turnNumber'], []).append(response)
+    return replay
+
+
+def parse_overrides(arguments: List[str]) -> Dict[str, str]:
+    overrides: Dict[str, str] = {}
+    for i, argument in enumerate(arguments[:-1]):
+        if argument == '-override-config':
+            for pair in arguments[i + 1].split(','):
+                if '=' in pair:
+                    key, value = pair.split('=', 1)
+                    overrides[key.strip()] = value.strip()
+    return overrides
+
+
+class Board:
+    def __init__(self, width: int, height: int):
+        self.width: int = width
+        self.height: int = height
+        self.stones: Dict[Tuple[int, int], str] = {}
+
+    def parse(self, move: str) -> Optional[Tuple[int, int]]:
+        if move.lower() == 'pass':
+            return None
+        return COLUMNS.index(move[0].upper()), self.height - int(move[1:])
+
+    def label(self, point: Tuple[int, int]) -> str:
+        return f'{COLUMNS[point[0]]}{self.height - point[1]}'
+
+    def hash(self, player: str, symmetric: bool) -> str:
+        # Like KataGo's, the hashes depend on the stones and the player to move alone, and symHash is the same for
+        # every rotation and reflection of the position.
+        def layout(transform) -> str:
+            return ' '.join(sorted(f'{color}{transform(x, y)}' for (x, y), color in self.stones.items()))
+
+        w, h = self.width - 1, self.height - 1
+        transforms = [lambda x, y: (x, y), lambda x, y: (w - x, y), lambda x, y: (x, h - y), lambda x, y: (w - x, h - y)]
+        if self.width == self.height:
+            transforms += [lambda x, y, t=t: t(y, x) for t in transforms]
+        stones = min(layout(t) for t in transforms) if symmetric else layout(transforms[0])
+        kind = 'sym' if symmetric else 'this'
+        return hashlib.md5(f'{kind}:{player}:{self.width}x{self.height}:{stones}'.encode('utf-8')).hexdigest().upper()
+
+    def neighbors(self, point: Tuple[int, int]):
+        x, y = point
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                yield nx, ny
+
+    def group(self, point: Tuple[int, int]) -> Tuple[Set[Tuple[int, int]], bool]:
+        color = self.stones[point]
+        seen = {point}
+        frontier = [point]
+        alive = False
+        while frontier:
+            for neighbor in self.neighbors(frontier.pop()):
+                occupant = self.stones.get(neighbor)
+                if occupant is None:
+                    alive = True
+                elif occupant == color and neighbor not in seen:
+                    seen.add(neighbor)
+                    frontier.append(neighbor)
+        return seen, alive
+
+    def play(self, player: str, move: str):
+        point = self.parse(move)
+        if point is None:
+            return
+        self.stones[point] = player
+        for neighbor in self.neighbors(point):
+            if self.stones.get(neighbor, player) != player:
+                stones, alive = self.group(neighbor)
+                if not alive:
+                    for stone in stones:
+                        del self.stones[stone]
+        stones, alive = self.group(point)
+        if not alive:
+            for stone in stones:
+                del self.stones[stone]
+
+
+class FakeKataGo:
+    def __init__(self, arguments: List[str]):
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument('-latency', type=float, default=0.05)
+        parser.add_argument('-replay', default=None)
+        parser.add_argument('-seed', type=int, default=0)
+        parser.add_argument('-crash-after', type=int, default=None)
+        parser.add_argument('-fail-after', type=int, default=None)
+        options, rest = parser.parse_known_args(arguments)
+        overrides = parse_overrides(rest)
+
+        self.latency: float = options.latency
+        self.seed: int = options.seed
+        self.crash_after: Optional[int] = options.crash_after
+        self.fail_after: Optional[int] = options.fail_after
+        self.failed: bool = False
+        self.analyzed: int = 0
+        self.playouts: int = int(overrides.get('maxPlayouts', 16384))
+        self.replay: Dict[str, Dict[int, List[Dict[str, Any]]]] = load_replay(options.replay) if options.replay else {}
+        # Like KataGo, the analysis threads take the highest priority position first, and positions of equal priority in
+        # the order they arrived.
+        self.pending: PriorityQueue = PriorityQueue()
+        self.arrivals = count()
+        self.threads: List[Thread] = [
+            Thread(target=self.work, daemon=True) for _ in range(int(overrides.get('numAnalysisThreads', 8)))
+        ]
+
+        self.write_lock: Lock = Lock()
+        self.terminated: Set[str] = set()
+        self.active: Dict[str, int] = {}
+
+    def emit(self, message: Dict[str, Any]):
+        line = json.dumps(message)
+        with self.write_lock:
+            if self.failed:
+                return
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def run(self):
+        for thread in self.threads:
+            thread.start()
+        print(f'KataGo v{VERSION}', file=sys.stderr, flush=True)
+        print('Started, ready to begin handling requests', file=sys.stderr, flush=True)
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                query = json.loads(line)
+            except ValueError:
+                self.emit({'error': 'Could not parse input line as json request', 'line': line})
+                continue
+            self.handle(query)
+        for _ in self.threads:
+            self.pending.put((math.inf, next(self.arrivals), None, None))
+        for thread in self.threads:
+            thread.join()
+
+    def work(self):
+        while True:
+            _, _, game, turn = self.pending.get()
+            if game is None:
+                return
+            self.analyze(game, turn)
+
+    def handle(self, query: Dict[str, Any]):
+        if 'id' not in query:
+            self.emit({'error': 'Request must have field "id"'})
+            return
+
+        action = query.get('action')
+        if action == 'terminate':
+            self.terminated.add(query.get('terminateId'))
+            self.emit({'id': query['id'], 'action': action, 'terminateId': query.get('terminateId')})
+            return
+        if action == 'terminate_all':
+            with self.write_lock:
+                self.terminated.update(self.active)
+            self.emit({'id': query['id'], 'action': action})
+            return
+        if action is not None:
+            self.emit({'id': query['id'], 'error': f'Unknown action: {action}'})
+            return
+
+        if 'boardXSize' not in query or 'moves' not in query:
+            self.emit({'id': query['id'], 'error': 'Query is missing boardXSize or moves'})
+            return
+
+        moves = query['moves']
+        turns = query.get('analyzeTurns') or [len(moves)]
+        game = Game(self, query)
+        with self.write_lock:
+            self.active[query['id']] = self.active.get(query['id'], 0) + len(turns)
+        priorities = query.get('priorities') or [query.get('priority', 0)] * len(turns)
+        for turn, priority in zip(turns, priorities):
+            self.pending.put((-priority, next(self.arrivals), game, turn))
+
+    def analyze(self, game: 'Game', turn: int):
+        query_id = game.query['id']
+        if query_id in self.terminated:
+            self.emit({'id': query_id, 'isDuringSearch': False, 'turnNumber': turn, 'noResults': True})
+            self.finished(query_id)
+            return
+
+        recorded = self.replay.get(game.key, {}).get(turn)
+        duration = self.latency * game.visits / self.playouts
+        report_every = game.query.get('reportDuringSearchEvery')
+        next_report = report_every or None
+
+        elapsed = 0.
+        while elapsed < duration and query_id not in self.terminated:
+            step = min(duration - elapsed, 0.05)
+            if next_report is not None:
+                step = min(step, next_report - elapsed)
+            time.sleep(step)
+            elapsed += step
+            if next_report is not None and next_report <= elapsed < duration:
+                self.emit(game.respond(turn, recorded, max(1, int(game.visits * elapsed / duration)), True))
+                next_report += report_every
+
+        if self.crash_after == 0:
+            # Like a query that reliably crashes KataGo: nothing is ever answered, however often it is relaunched.
+            print('Crashing before finishing any position, as asked.', file=sys.stderr, flush=True)
+            os._exit(1)
+
+        searched = game.visits if elapsed >= duration else max(1, int(game.visits * elapsed / duration))
+        self.emit(game.respond(turn, recorded, searched, False))
+        self.finished(query_id)
+
+        if self.crash_after is not None or self.fail_after is not None:
+            with self.write_lock:
+                self.analyzed += 1
+                if self.crash_after is not None and self.analyzed >= self.crash_after:
+                    print(f'Crashing after {self.analyzed} positions, as asked.', file=sys.stderr, flush=True)
+                    os._exit(1)
+                if self.fail_after is not None and self.analyzed >= self.fail_after and not self.failed:
+                    # Like a KataGo whose GPU has failed: it says so, then hangs.
+                    print(f'Uncaught exception: failing after {self.analyzed} positions, as asked.', file=sys.stderr,
+                          flush=True)
+                    self.failed = True
+
+    def finished(self, query_id: str):
+        with self.write_lock:
+            self.active[query_id] -= 1
+            if self.active[query_id] <= 0:
+                del self.active[query_id]
+
+
+class Game:
+    def __init__(self, engine: FakeKataGo, query: Dict[str, Any]):
+        self.query: Dict[str, Any] = query
+        self.key: str = query_key(query)
+        self.seed: int = engine.seed
+        self.visits: int = min(query.get('maxVisits') or engine.playouts, engine.playouts)
+        self.width: int = query['boardXSize']
+        self.height: int = query.get('boardYSize', self.width)
+        self.profile: Optional[str] = (query.get('overrideSettings') or {}).get('humanSLProfile')
+
+        # The game's score swings are fixed by its moves alone, so the deep query and every profile query agree on them.
+        moves = query['moves']
+        rng = self.rng('lead', json.dumps(moves))
+        komi = query.get('komi', 7.5)
+        self.black_leads: List[float] = [7. - komi]
+        for _ in moves:
+            self.black_leads.append(self.black_leads[-1] + rng.gauss(0., 1.5))
+
+    def rng(self, *parts: Any) -> random.Random:
+        digest = hashlib.sha256(json.dumps([self.seed, *parts]).encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def position(self, turn: int) -> Tuple[Board, str]:
+        board = Board(self.width, self.height)
+        for player, move in self.query.get('initialStones') or []:
+            board.play(player, move)
+
+        moves = self.query['moves']
+        for player, move in moves[:turn]:
+            board.play(player, move)
+
+        if turn < len(moves):
+            player = moves[turn][0]
+        elif moves:
+            player = 'W' if moves[-1][0] == 'B' else 'B'
+        else:
+            player = self.query.get('initialPlayer') or 'B'
+        return board, player
+
+    def policy(self, board: Board, rng: random.Random) -> List[float]:
+        values: List[float] = []
+        for y in range(self.height):
+            for x in range(self.width):
+                values.append(-1. if (x, y) in board.stones else rng.random() ** 6)
+        values.append(0.001)
+        total = sum(v for v in values if v >= 0)
+        return [v / total if v >= 0 else -1. for v in values]
+
+    def respond(self, turn: int, recorded: Optional[List[Dict[str, Any]]], visits: int, during: bool) -> Dict[str, Any]:
+        if recorded:
+            response = next((r for r in recorded if r.get('isDuringSearch', False) == during), recorded[-1])
+            return {**response, 'id': self.query['id'], 'isDuringSearch': during}
+
+        board, player = self.position(turn)
+        rng = self.rng('position', json.dumps(self.query['moves'][:turn]), turn)
+        sign = 1. if player == 'B' else -1.
+        # Early in a search, the estimates wander around where they will settle.
+        noise = 0. if not during else (1. - visits / self.visits) * 2.
+        lead = sign * self.black_leads[min(turn, len(self.black_leads) - 1)] + rng.gauss(0., 0.3 + noise)
+        policy = self.policy(board, rng)
+
+        labels = [board.label((i % self.width, i // self.width)) for i in range(self.width * self.height)] + ['pass']
+        ranked = sorted((i for i, v in enumerate(policy) if v >= 0), key=lambda i: -policy[i])[:8]
+        move_infos = []
+        remaining = visits
+        for order, index in enumerate(ranked):
+            move_visits = remaining // 2 if order < len(ranked) - 1 else remaining
+            remaining -= move_visits
+            score = lead - (0. if order == 0 else abs(rng.gauss(0.8 * order, 0.5)))
+            winrate = 1. / (1. + math.exp(-score / 4.))
+            pv = [labels[index]] + [labels[i] for i in rng.sample(ranked, min(3, len(ranked)))]
+            move_infos.append({
+                'edgeVisits': move_visits, 'edgeWeight': float(move_visits), 'lcb': winrate - 0.02,
+                'move': labels[index], 'order': order, 'playSelectionValue': float(move_visits),
+                'prior': policy[index], 'scoreLead': score, 'scoreMean': score, 'scoreSelfplay': score * 1.1,
+                'scoreStdev': 12., 'utility': 2. * winrate - 1., 'utilityLcb': 2. * winrate - 1.05,
+                'visits': move_visits, 'weight': float(move_visits), 'winrate': winrate, 'pv': pv,
+            })
+
+        winrate = 1. / (1. + math.exp(-lead / 4.))
+        response: Dict[str, Any] = {
+            'id': self.query['id'],
+            'isDuringSearch': during,
+            'turnNumber': turn,
+            'moveInfos': move_infos,
+            'rootInfo': {
+                'currentPlayer': player, 'rawLead': lead, 'rawNoResultProb': 0., 'rawScoreSelfplay': lead * 1.1,
+                'rawScoreSelfplayStdev': 12., 'rawStScoreError': 1., 'rawStWrError': 0.05, 'rawVarTimeLeft': 10.,
+                'rawWinrate': winrate, 'scoreLead': lead, 'scoreSelfplay': lead * 1.1, 'scoreStdev': 12.,
+                'symHash': board.hash(player, symmetric=True), 'thisHash': board.hash(player, symmetric=False),
+                'utility': 2. * winrate - 1., 'visits': visits, 'weight': float(visits), 'winrate': winrate,
+            },
+        }
+        if self.query.get('includePolicy'):
+            response['policy'] = policy
+            if self.profile:
+                human = self.policy(board, self.rng('human', self.profile, turn, self.key))
+                response['humanPolicy'] = [(p + h) / 2. if p >= 0 else -1. for p, h in zip(policy, human)]
+        if self.query.get('includeOwnership'):
+            response['ownership'] = [
+                (0.9 * sign if board.stones[(x, y)] == 'B' else -0.9 * sign)
+                if (x, y) in board.stones else math.tanh(rng.gauss(0., 0.5))
+                for y in range(self.height) for x in range(self.width)
+            ]
+        return response
+
+
+if __name__ == '__main__':
+    FakeKataGo(sys.argv[1:]).run()
@@ -0,0 +1,25 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from mashumaro import field_options
+
+
+@dataclass
+class FakeEngineConfiguration:
+    latency: float = field(default=0.05)  # seconds per position searched to the full playout budget
+    replay: str | None = field(default=None)  # a recordFile captured from a real KataGo
+    seed: int = field(default=0)
+    crash_after: int | None = field(default=None, metadata=field_options(alias="crashAfter"))  # positions, then exit
+    # positions, then report a fatal error on stderr and stop answering without exiting
+    fail_after: int | None = field(default=None, metadata=field_options(alias="failAfter"))
+
+    @property
+    def arguments(self) -> List[str]:
+        arguments = ['-latency', str(self.latency), '-seed', str(self.seed)]
+        if self.replay is not None:
+            arguments.extend(['-replay', self.replay])
+        if self.crash_after is not None:
+            arguments.extend(['-crash-after', str(self.crash_after)])
+        if self.fail_after is not None:
+            arguments.extend(['-fail-after', str(self.fail_after)])
+        return arguments
@@ -1,11 +1,16 @@
+import os
+import sys
 from dataclasses import dataclass, field
-from typing import Union, Dict
+from typing import Union, Dict, List
 
 from mashumaro import field_options
 from mashumaro.mixins.yaml import DataClassYAMLMixin
 
+from katago.fakeengineconfiguration import FakeEngineConfiguration
 from katago.shared.humanprofile import HumanProfile
 
+FAKE_ENGINE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake.py')
+
 
 @dataclass
 class LaunchConfiguration(DataClassYAMLMixin):
@@ -22,27 +27,49 @@ class LaunchConfiguration(DataClassYAMLMixin):
         default=None,
         metadata=field_options(alias="overrideConfig")
     )
+    instances: int = field(default=1)
+    instance_override_config: List[Dict[str, Union[float, int, str]]] | None = field(
+        default=None,
+        metadata=field_options(alias="instanceOverrideConfig")
+    )
     playouts: int = field(default=16384)
     visits: int = field(default=1048576)
     fastQuit: bool = field(default=True, metadata=field_options(alias="fastQuit"))
+    max_restarts: int = field(default=3, metadata=field_options(alias="maxRestarts"))
+    daemon_socket: str | None = field(default=None, metadata=field_options(alias="daemonSocket"))
+    response_buffer: int = field(default=256, metadata=field_options(alias="responseBuffer"))
+    query_deadline: float | None = field(default=None, metadata=field_options(alias="queryDeadline"))
+    metrics_file: str | None = field(default=None, metadata=field_options(alias="metricsFile"))
+    fake_engine: FakeEngineConfiguration | None = field(default=None, metadata=field_options(alias="fakeEngine"))
+    record_file: str | None = field(default=None, metadata=field_options(alias="recordFile"))
 
     @property
-    def launch_script(self) -> str:
-        representation = (
-            f'{self.executable} analysis '
-            f'-config {self.config} '
-            f'-model {self.search_model} '
-            f'-human-model {self.human_model} '
-            f'-override-config humanSLProfile={self.profile},'
+    def launch_arguments(self) -> List[str]:
+        # The fake engine accepts (and ignores) all of KataGo's own arguments, so only the program changes.
+        program = [self.executable] if self.fake_engine is None else [sys.executable, FAKE_ENGINE_SCRIPT]
+        arguments = [
+            *program,
+            'analysis',
+            '-config', self.config,
+            '-model', self.search_model,
+            '-human-model', self.human_model,
+            '-override-config',
+            f'humanSLProfile={self.profile},'
             f'numAnalysisThreads={self.analysis_threads},'
             f'numSearchThreads={self.search_threads},'
             f'maxPlayouts={self.playouts},'
             f'maxVisits={self.visits},'
-            f'reportAnalysisWinrateAs=SIDETOMOVE' # hardcoded because this application cannot work well otherwise!
-        )
+            f'reportAnalysisWinrateAs=SIDETOMOVE'  # hardcoded because this application cannot work well otherwise!
+        ]
         if self.fastQuit:
-            representation += ' -quit-without-waiting'
+            arguments.append('-quit-without-waiting')
         if self.override_config is not None:
             for key, value in self.override_config.items():
-                representation += f' -override-config {key}={value}'
-        return representation
+                arguments.extend(['-override-config', f'{key}={value}'])
+        if self.fake_engine is not None:
+            arguments.extend(self.fake_engine.arguments)
+        return arguments
+
+    @property
+    def launch_script(self) -> str:
+        return ' '.join(self.launch_arguments)
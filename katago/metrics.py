@@ -0,0 +1,166 @@
+import json
+import time
+from collections import deque
+from threading import Lock
+from typing import Deque, Dict, List, Optional
+
+# Only the most recent latencies are kept so that a long-lived process analyzing many games does not grow without bound.
+_LATENCY_WINDOW = 4096
+
+_GAUGES = {'outstanding_queries', 'elapsed_seconds'}
+
+
+class _QueryTiming:
+    __slots__ = ('written', 'first', 'shares', 'cancelled')
+
+    def __init__(self, written: float, shares: int):
+        self.written: float = written
+        self.first: Optional[float] = None
+        self.shares: int = shares
+        self.cancelled: bool = False
+
+
+class EngineMetrics:
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._started: Optional[float] = None
+        self._timings: Dict[str, _QueryTiming] = {}
+
+        self.queries_submitted: int = 0
+        self.queries_finished: int = 0
+        self.queries_cancelled: int = 0
+        self.responses: int = 0
+        self.positions: int = 0
+        self.visits: int = 0
+        self.bytes_read: int = 0
+        self.decode_seconds: float = 0.
+        self.restarts: int = 0
+        self.lost_seconds: float = 0.
+
+        self.first_response_latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.last_response_latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+    @property
+    def outstanding_queries(self) -> int:
+        return len(self._timings)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started if self._started is not None else 0.
+
+    @property
+    def positions_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.positions / elapsed if elapsed > 0 else 0.
+
+    @property
+    def visits_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.visits / elapsed if elapsed > 0 else 0.
+
+    def query_written(self, query_id: str, shares: int = 1):
+        # An EnginePool splits a query across its instances under one id.  It announces the shares before any instance
+        # writes its own, so the query is counted once and only finishes with its last share.
+        now = time.monotonic()
+        with self._lock:
+            if query_id in self._timings:
+                return
+            if self._started is None:
+                self._started = now
+            self._timings[query_id] = _QueryTiming(now, shares)
+            self.queries_submitted += 1
+
+    def line_read(self, size: int, decode_seconds: float):
+        with self._lock:
+            self.bytes_read += size
+            self.decode_seconds += decode_seconds
+
+    def response_received(self, query_id: str, is_during_search: bool, visits: int):
+        now = time.monotonic()
+        with self._lock:
+            self.responses += 1
+            timing = self._timings.get(query_id)
+            if timing is not None and timing.first is None:
+                timing.first = now
+                self.first_response_latencies.append(now - timing.written)
+            if not is_during_search:
+                self.positions += 1
+                self.visits += visits
+
+    def engine_restarted(self, lost_seconds: float):
+        # Counted once KataGo is back and its unfinished work resubmitted, from the moment the crash was detected.
+        with self._lock:
+            self.restarts += 1
+            self.lost_seconds += lost_seconds
+
+    def query_finished(self, query_id: str, cancelled: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            timing = self._timings.get(query_id)
+            if timing is None:
+                return
+            timing.cancelled = timing.cancelled or cancelled
+            timing.shares -= 1
+            if timing.shares > 0:
+                return
+            del self._timings[query_id]
+            if timing.cancelled:
+                self.queries_cancelled += 1
+            else:
+                self.queries_finished += 1
+                self.last_response_latencies.append(now - timing.written)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            first = sorted(self.first_response_latencies)
+            last = sorted(self.last_response_latencies)
+            return {
+                'queries_submitted': self.queries_submitted,
+                'queries_finished': self.queries_finished,
+                'queries_cancelled': self.queries_cancelled,
+                'outstanding_queries': self.outstanding_queries,
+                'responses': self.responses,
+                'positions': self.positions,
+                'visits': self.visits,
+                'bytes_read': self.bytes_read,
+                'decode_seconds': self.decode_seconds,
+                'restarts': self.restarts,
+                'lost_seconds': self.lost_seconds,
+                'elapsed_seconds': self.elapsed,
+                'positions_per_second': self.positions_per_second,
+                'visits_per_second': self.visits_per_second,
+                'first_response_latency_mean': _mean(first),
+                'first_response_latency_p50': _percentile(first, 0.5),
+                'first_response_latency_p95': _percentile(first, 0.95),
+                'last_response_latency_mean': _mean(last),
+                'last_response_latency_p50': _percentile(last, 0.5),
+                'last_response_latency_p95': _percentile(last, 0.95),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2) + '\n'
+
+    def to_prometheus(self, prefix: str = 'katago') -> str:
+        lines: List[str] = []
+        for name, value in self.snapshot().items():
+            kind = 'gauge' if name in _GAUGES or '_per_second' in name or '_latency_' in name else 'counter'
+            metric = f'{prefix}_{name}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# TYPE {metric} {kind}')
+            lines.append(f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, filename: str):
+        # The format follows the extension: .prom (or .txt) for the Prometheus text format, JSON otherwise.
+        text = self.to_prometheus() if filename.endswith(('.prom', '.txt')) else self.to_json()
+        with open(filename, 'w', encoding='utf-8') as outfile:
+            outfile.write(text)
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -4,3 +4,4 @@ from .move import MoveDTO
 from .moverestriction import MoveRestriction
 from .placement import Placement
 from .obj import Query
+from .encoder import QueryEncoder
@@ -0,0 +1,43 @@
+import dataclasses
+import json
+from typing import Any, Dict, Optional
+
+from katago.query.obj import Query
+
+# The fields that tell a game's queries apart.  Everything else (the moves above all) is the same for every query of a
+# game, so it is serialized once and these are spliced onto it.  All of them are plain JSON values.
+_VARYING_FIELDS: Dict[str, str] = {
+    'id': 'id',
+    'analyze_turns': 'analyzeTurns',
+    'include_ownership': 'includeOwnership',
+    'include_policy': 'includePolicy',
+    'max_visits': 'maxVisits',
+    'override_settings': 'overrideSettings',
+    'priorities': 'priorities',
+    'priority': 'priority',
+    'report_during_search_every': 'reportDuringSearchEvery',
+}
+_BLANK: Dict[str, None] = {name: None for name in _VARYING_FIELDS}
+
+
+class QueryEncoder:
+    # Serializes queries exactly as Query.to_json() does, but only runs the full serialization when the invariant part of
+    # the query changes.  Not thread safe; each batch of queries gets its own.
+    def __init__(self):
+        self._invariant: Optional[Query] = None
+        self._prefix: str = ''
+
+    def encode(self, query: Query) -> str:
+        invariant = dataclasses.replace(query, **_BLANK)
+        if invariant != self._invariant:
+            self._invariant = invariant
+            self._prefix = invariant.to_json()[:-1]
+
+        varying: Dict[str, Any] = {}
+        for name, key in _VARYING_FIELDS.items():
+            value = getattr(query, name)
+            if value is not None:
+                varying[key] = value
+        if not varying:
+            return self._prefix + '}'
+        return f'{self._prefix}, {json.dumps(varying)[1:]}'
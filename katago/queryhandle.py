@@ -0,0 +1,134 @@
+from concurrent.futures import CancelledError
+from queue import Queue, Empty, Full
+from threading import Lock, Timer
+from typing import Callable, Iterator, List, Optional
+
+from katago.response import SuccessResponse
+
+
+class QueryHandle:
+    def __init__(self, query_id: str, expected: int, capacity: Optional[int] = None):
+        self._id: str = query_id
+        self._expected: int = expected
+
+        # A bounded queue makes the reader thread wait for the consumer instead of piling up decoded responses.  The wait
+        # propagates back to KataGo through its stdout pipe.
+        self._queue: Queue[SuccessResponse] = Queue(maxsize=capacity or 0)
+        self._received: int = 0
+        self._received_lock: Lock = Lock()
+        self._delivered: int = 0
+        self._done_callbacks: List[Callable[['QueryHandle'], None]] = []
+        self._error: Optional[BaseException] = None
+        self._deadline: Optional[Timer] = None
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def expected(self) -> int:
+        return self._expected
+
+    @property
+    def received(self) -> int:
+        return self._received
+
+    @property
+    def complete(self) -> bool:
+        return self._received >= self._expected
+
+    @property
+    def done(self) -> bool:
+        return self._delivered >= self._expected
+
+    @property
+    def cancelled(self) -> bool:
+        return self._error is not None
+
+    @property
+    def buffered(self) -> int:
+        return self._queue.qsize()
+
+    def add_done_callback(self, callback: Callable[['QueryHandle'], None]):
+        if self.done:
+            callback(self)
+        else:
+            self._done_callbacks.append(callback)
+
+    def set_deadline(self, seconds: float, on_expire: Callable[[TimeoutError], None]):
+        # on_expire is handed the TimeoutError to cancel the query with.  The timer stops once the handle is done or
+        # cancelled.
+        error = TimeoutError(f'Query {self._id} did not finish within {seconds} seconds.')
+        timer = Timer(seconds, on_expire, args=(error,))
+        timer.daemon = True
+        self._deadline = timer
+        timer.start()
+        self.add_done_callback(lambda _: self._clear_deadline())
+
+    def _clear_deadline(self):
+        timer, self._deadline = self._deadline, None
+        if timer is not None:
+            timer.cancel()
+
+    def cancel(self, error: Optional[BaseException] = None):
+        self._clear_deadline()
+        if self._error is not None:
+            return
+        self._error = error or CancelledError(f'Query {self._id} was cancelled.')
+
+        # Throw away whatever is buffered so a reader thread blocked on a full queue can move on, then wake the consumer.
+        while True:
+            self._discard_buffered()
+            try:
+                self._queue.put_nowait(None)
+                break
+            except Full:
+                continue
+
+    def _discard_buffered(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                return
+
+    def put(self, response: SuccessResponse):
+        if self._error is not None:
+            return
+
+        # An EnginePool routes several KataGo processes' reader threads into the same handle.
+        if not response.is_during_search:
+            with self._received_lock:
+                self._received += 1
+        self._queue.put(response)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Optional[SuccessResponse]:
+        if self._error is not None:
+            raise self._error
+
+        try:
+            response = self._queue.get(block=block, timeout=timeout)
+        except Empty:
+            return None
+
+        if response is None:
+            self._queue.put_nowait(None)  # leave the wake-up in place for any other consumer
+            raise self._error
+
+        if not response.is_during_search:
+            self._delivered += 1
+            if self.done:
+                callbacks, self._done_callbacks = self._done_callbacks, []
+                for callback in callbacks:
+                    callback(self)
+        return response
+
+    def responses(self, timeout: Optional[float] = None) -> Iterator[SuccessResponse]:
+        while not self.done:
+            response = self.get(timeout=timeout)
+            if response is None:
+                raise TimeoutError(f'Query {self._id} produced no response within {timeout} seconds.')
+            yield response
+
+    def __iter__(self) -> Iterator[SuccessResponse]:
+        return self.responses()
@@ -0,0 +1,172 @@
+import io
+import json
+import socket
+import time
+import uuid
+from threading import Lock, Thread
+from typing import Dict, List, Optional
+
+from katago.metrics import EngineMetrics
+from katago.query import Query, QueryEncoder
+from katago.queryhandle import QueryHandle
+from katago.response import SuccessResponse, parse_success_response
+
+
+class RemoteEngine:
+    def __init__(self, socket_path: str, output: bool = False, capacity: Optional[int] = None):
+        self._output: bool = output
+        self._capacity: Optional[int] = capacity
+        self._handles: Dict[str, QueryHandle] = {}
+        self._write_lock: Lock = Lock()
+        self._remaining: Dict[str, int] = {}
+        self._metrics: EngineMetrics = EngineMetrics()
+
+        self._socket: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._reader: io.BufferedReader = self._socket.makefile('rb')
+        self._writer: io.BufferedWriter = self._socket.makefile('wb')
+
+        # The daemon greets every client with the version of the KataGo it owns.
+        greeting = json.loads(self._reader.readline().decode('utf-8'))
+        self._version: str = greeting['version']
+
+        self._outputs: Thread = Thread(target=self._read_responses)
+        self._outputs.daemon = True
+        self._outputs.start()
+
+    def _read_responses(self):
+        for raw in self._reader:
+            line = raw.decode('utf-8').rstrip()
+            if not line:
+                continue
+            if self._output:
+                print(f'#  Daemon read: {line}')
+
+            decode_start = time.perf_counter()
+            try:
+                response = parse_success_response(line)
+            except Exception:
+                if not self._output:
+                    print(f'#  The KataGo daemon wrote a message that is not a success response: {line}')
+                continue
+            finally:
+                self._metrics.line_read(len(raw), time.perf_counter() - decode_start)
+
+            handle = self._handles.get(response.id)
+            if handle is not None:
+                self._metrics.response_received(response.id, response.is_during_search, response.root_info.visits)
+                handle.put(response)
+            if not response.is_during_search and response.id in self._remaining:
+                self._remaining[response.id] -= 1
+                if self._remaining[response.id] <= 0:
+                    del self._remaining[response.id]
+                    self._metrics.query_finished(response.id)
+
+    @property
+    def version(self) -> str:
+        return self._version
+
+    @property
+    def ready(self) -> bool:
+        return True
+
+    @property
+    def metrics(self) -> EngineMetrics:
+        # These are measured on this side of the socket, so latencies include the trip through the daemon.
+        return self._metrics
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def write_query(self, query: Query) -> str:
+        return self.submit(query).id
+
+    def submit(
+        self,
+        query: Query,
+        handle: Optional[QueryHandle] = None,
+        deadline: Optional[float] = None
+    ) -> QueryHandle:
+        query.id = str(uuid.uuid4())
+        expected = len(query.analyze_turns) if query.analyze_turns else 1
+        if handle is None:
+            handle = QueryHandle(query.id, expected, self._capacity)
+        self._register(query.id, expected, handle)
+
+        self._write_line(query.to_json())
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def _register(self, query_id: str, expected: int, handle: QueryHandle):
+        self._handles[query_id] = handle
+        handle.add_done_callback(lambda _: self._handles.pop(query_id, None))
+        self._remaining[query_id] = expected
+        self._metrics.query_written(query_id)
+
+    def _write_line(self, serialized: str):
+        encoded: bytes = (serialized + '\n').encode('utf-8')
+        with self._write_lock:
+            self._writer.write(encoded)
+            self._writer.flush()
+        if self._output:
+            print(f'# Passed query to the KataGo daemon: {encoded}')
+
+    def submit_batch(self, queries: List[Query], deadline: Optional[float] = None) -> QueryHandle:
+        expected = sum(len(query.analyze_turns) if query.analyze_turns else 1 for query in queries)
+        handle = QueryHandle(str(uuid.uuid4()), expected, self._capacity)
+        encoder = QueryEncoder()
+        lines: List[str] = []
+        for query in queries:
+            query.id = str(uuid.uuid4())
+            self._register(query.id, len(query.analyze_turns) if query.analyze_turns else 1, handle)
+            lines.append(encoder.encode(query))
+        self._write_line('\n'.join(lines))
+        if deadline is not None:
+            handle.set_deadline(deadline, lambda error: self.cancel(handle.id, error))
+        return handle
+
+    def cancel(self, query_id: Optional[str] = None, error: Optional[BaseException] = None) -> bool:
+        # The daemon terminates only this client's queries, even for terminate_all.
+        if query_id is None:
+            handles = set(self._handles.values())
+        else:
+            handle = self._handles.get(query_id)
+            if handle is None:
+                handle = next((h for h in self._handles.values() if h.id == query_id), None)
+            if handle is None:
+                return False
+            handles = {handle}
+
+        terminated = [i for i, h in self._handles.items() if h in handles]
+        if query_id is None:
+            self._write_line(json.dumps({'id': str(uuid.uuid4()), 'action': 'terminate_all'}))
+        else:
+            for i in terminated:
+                self._write_line(json.dumps({'id': str(uuid.uuid4()), 'action': 'terminate', 'terminateId': i}))
+
+        for handle in handles:
+            handle.cancel(error)
+        for i in terminated:
+            self._handles.pop(i, None)
+            if self._remaining.pop(i, None) is not None:
+                self._metrics.query_finished(i, cancelled=True)
+        return True
+
+    def handle(self, query_id: str) -> Optional[QueryHandle]:
+        return self._handles.get(query_id)
+
+    def next_response(
+        self,
+        query_id: str,
+        block: bool = False,
+        timeout: Optional[float] = None
+    ) -> Optional[SuccessResponse]:
+        handle = self._handles.get(query_id)
+        return handle.get(block=block, timeout=timeout) if handle else None
+
+    def kill(self):
+        # Detach only.  The daemon and its KataGo process stay warm for the next run.
+        self._writer.close()
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._socket.close()
@@ -4,3 +4,6 @@ from .rootinfo import RootInfo
 from .warning import WarningResponse
 
 from .success import SuccessResponse
+
+from .lazy import LazyMoveInfo, LazyRootInfo, LazySuccessResponse
+from .parse import parse_success_response
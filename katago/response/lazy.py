@@ -0,0 +1,151 @@
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from katago.shared import Coordinate, Pass, Player, str_to_enum
+
+try:
+    import orjson
+
+    def _loads(line: str) -> Dict[str, Any]:
+        return orjson.loads(line)
+
+    def _dumps(raw: Dict[str, Any]) -> str:
+        return orjson.dumps(raw).decode('utf-8')
+except ImportError:
+    import json
+
+    def _loads(line: str) -> Dict[str, Any]:
+        return json.loads(line)
+
+    def _dumps(raw: Dict[str, Any]) -> str:
+        return json.dumps(raw)
+
+_MOVES: Dict[str, Union[Coordinate, Pass]] = {**{c.value: c for c in Coordinate}, 'pass': Pass.PASS}
+
+
+def _to_move(name: str) -> Union[Coordinate, Pass]:
+    found = _MOVES.get(name)
+    return found if found is not None else str_to_enum(name)
+
+
+def _to_array(values: List[float]) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+class _Field:
+    # Reads a field straight out of the decoded JSON object the first time it is accessed.  Converted values are cached
+    # on the instance, which also shadows this descriptor so later reads cost a plain attribute lookup.
+    def __init__(self, key: str, convert: Optional[Callable[[Any], Any]] = None):
+        self._key: str = key
+        self._convert: Optional[Callable[[Any], Any]] = convert
+        self._name: Optional[str] = None
+
+    def __set_name__(self, owner, name: str):
+        self._name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        value = instance.raw.get(self._key)
+        if self._convert is not None and value is not None:
+            value = self._convert(value)
+            instance.__dict__[self._name] = value
+        return value
+
+
+class LazyMoveInfo:
+    edge_visits: int = _Field('edgeVisits')
+    edge_weight: float = _Field('edgeWeight')
+    lcb: float = _Field('lcb')
+    move: Union[Coordinate, Pass] = _Field('move', _to_move)
+    order: int = _Field('order')
+    play_selection_value: float = _Field('playSelectionValue')
+    prior: float = _Field('prior')
+    score_lead: float = _Field('scoreLead')
+    score_mean: float = _Field('scoreMean')
+    score_selfplay: float = _Field('scoreSelfplay')
+    score_stdev: float = _Field('scoreStdev')
+    utility: float = _Field('utility')
+    utility_lcb: float = _Field('utilityLcb')
+    visits: int = _Field('visits')
+    weight: float = _Field('weight')
+    winrate: float = _Field('winrate')
+
+    pv: List[Union[Coordinate, Pass]] = _Field('pv', lambda pv: [_to_move(x) for x in pv])
+
+    human_prior: Optional[float] = _Field('humanPrior')
+    is_symmetry_of: Optional[Coordinate] = _Field('isSymmetryOf', _to_move)
+    ownership: Optional[np.ndarray] = _Field('ownership', _to_array)
+    ownership_stdev: Optional[np.ndarray] = _Field('ownershipStdev', _to_array)
+    pv_edge_visits: Optional[List[int]] = _Field('pvEdgeVisits')
+    pv_visits: Optional[List[int]] = _Field('pvVisits')
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw: Dict[str, Any] = raw
+
+
+class LazyRootInfo:
+    current_player: Player = _Field('currentPlayer', Player)
+    raw_lead: float = _Field('rawLead')
+    raw_no_result_prob: float = _Field('rawNoResultProb')
+    raw_score_selfplay: float = _Field('rawScoreSelfplay')
+    raw_score_selfplay_stdev: float = _Field('rawScoreSelfplayStdev')
+    raw_st_score_error: float = _Field('rawStScoreError')
+    raw_st_wr_error: float = _Field('rawStWrError')
+    raw_var_time_left: float = _Field('rawVarTimeLeft')
+    raw_winrate: float = _Field('rawWinrate')
+    score_selfplay: float = _Field('scoreSelfplay')
+    score_lead: float = _Field('scoreLead')
+    score_stdev: float = _Field('scoreStdev')
+    sym_hash: str = _Field('symHash')
+    this_hash: str = _Field('thisHash')
+    utility: float = _Field('utility')
+    visits: int = _Field('visits')
+    weight: float = _Field('weight')
+    winrate: float = _Field('winrate')
+
+    human_score_mean: Optional[float] = _Field('humanScoreMean')
+    human_score_stdev: Optional[float] = _Field('humanScoreStdev')
+    human_st_score_error: Optional[float] = _Field('humanStScoreError')
+    human_st_wr_error: Optional[float] = _Field('humanStWrError')
+    human_winrate: Optional[float] = _Field('humanWinrate')
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw: Dict[str, Any] = raw
+
+
+class LazySuccessResponse:
+    """A drop-in stand-in for SuccessResponse that decodes each field only when something reads it."""
+
+    is_during_search: bool = _Field('isDuringSearch')
+    move_infos: List[LazyMoveInfo] = _Field('moveInfos', lambda infos: [LazyMoveInfo(x) for x in infos])
+    root_info: LazyRootInfo = _Field('rootInfo', LazyRootInfo)
+    turn_number: int = _Field('turnNumber')
+
+    human_policy: Optional[np.ndarray] = _Field('humanPolicy', _to_array)
+    ownership: Optional[np.ndarray] = _Field('ownership', _to_array)
+    ownership_stdev: Optional[np.ndarray] = _Field('ownershipStdev', _to_array)
+    policy: Optional[np.ndarray] = _Field('policy', _to_array)
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.raw: Dict[str, Any] = raw
+
+    @property
+    def id(self) -> str:
+        return self.raw['id']
+
+    @id.setter
+    def id(self, value: str):
+        self.raw['id'] = value
+
+    def to_json(self) -> str:
+        return _dumps(self.raw)
+
+    @classmethod
+    def from_json(cls, line: str) -> 'LazySuccessResponse':
+        raw = _loads(line)
+        if 'error' in raw or 'warning' in raw or 'action' in raw or 'moveInfos' not in raw:
+            raise ValueError('not a success response')
+        return cls(raw)
@@ -0,0 +1,8 @@
+from katago.response.lazy import LazySuccessResponse
+
+
+def parse_success_response(line: str) -> LazySuccessResponse:
+    # Unmarshalling every response through dataclasses_json dominated analysis time, and it still mangled the moves.  The
+    # lazy response decodes the line once with the fastest JSON backend available and only converts the fields that
+    # something actually reads.
+    return LazySuccessResponse.from_json(line)
@@ -0,0 +1,22 @@
+import sys
+
+from katago.daemon import EngineDaemon
+from main import load_configuration, launch_engine
+
+if __name__ == '__main__':
+    configuration = load_configuration()
+    launch_config = configuration['katago']
+    socket_path = launch_config.daemon_socket if len(sys.argv) < 2 else sys.argv[1]
+    if not socket_path:
+        print('Set katago.daemonSocket in configuration/application.yaml or pass a socket path.')
+        sys.exit(1)
+
+    print('Starting KataGo...')
+    engine = launch_engine(launch_config)
+    print('KataGo started.')
+
+    daemon = EngineDaemon(engine, socket_path)
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        print('KataGo daemon stopped.')
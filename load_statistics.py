@@ -1,19 +1,18 @@
 # © 2021 Joseph Craig <the.sadakatsu@gmail.com>
 # This code is not released under a standard OSS license.  Please read README.md.
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import re
 import sys
 
+from analysisfile.analysis_archive import load_game_analysis
 
-def load_performances_new(analysis_filename: str) -> dict:
-    loaded = load(analysis_filename)
-    if not loaded:
-        print(f'Failed to load {analysis_filename}')
-        sys.exit(4)
-    date, game_name, dataframe = loaded
+
+def load_performances_new(analysis_filename: str, dataframe: Optional[pd.DataFrame] = None) -> dict:
+    if dataframe is None:
+        dataframe = load_dataframe(analysis_filename)
 
     black_moves = dataframe[dataframe['Player'] == 'B']
     white_moves = dataframe[dataframe['Player'] == 'W']
@@ -66,14 +65,31 @@ def load_performances(analysis_filename, use_rounded=True, minimum_moves=21):
     return performances
 
 
-def load(analysis_filename):
-    matcher = re.search(r'^(?:[^/\\]*[/\\])*(?P<date>\d{4,}-\d{2}-\d{2})__.*__(?P<name>.+).csv$', analysis_filename)
+def load_dataframe(analysis_filename: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    loaded = load(analysis_filename, columns)
+    if not loaded:
+        print(f'Failed to load {analysis_filename}')
+        sys.exit(4)
+    return loaded[2]
+
+
+def load(analysis_filename, columns: Optional[List[str]] = None):
+    matcher = re.search(
+        r'^(?:[^/\\]*[/\\])*(?P<date>\d{4,}-\d{2}-\d{2})__.*__(?P<name>.+)(?P<extension>\.csv|\.npz)$',
+        analysis_filename
+    )
     if not matcher:
         return None
+
+    # Analyses written before the binary format are still read from their CSVs.
+    if matcher.group('extension') == '.csv':
+        dataframe = pd.read_csv(analysis_filename, usecols=columns)
+    else:
+        dataframe = load_game_analysis(analysis_filename).frame(columns)
     return (
         matcher.group('date'),
         matcher.group('name'),
-        pd.read_csv(analysis_filename)
+        dataframe
     )
 
 
@@ -87,14 +103,16 @@ def get_mistakes(dataframe, player, use_rounded=True):
     return result
 
 
-def get_expected_result(analysis_filename: str) -> List[float]:
-    _1, _2, dataframe = load(analysis_filename)
+def get_expected_result(analysis_filename: str, dataframe: Optional[pd.DataFrame] = None) -> List[float]:
+    if dataframe is None:
+        dataframe = load_dataframe(analysis_filename)
     subset = zip(dataframe['Player'], dataframe['Posterior Lead'])
     return [np.round(x if p == 'B' else -x, 1) for p, x in subset]
 
 
-def get_worst_moves(analysis_filename: str) -> Tuple[List[int], np.array]:
-    _1, _2, dataframe = load(analysis_filename)
+def get_worst_moves(analysis_filename: str, dataframe: Optional[pd.DataFrame] = None) -> Tuple[List[int], np.array]:
+    if dataframe is None:
+        dataframe = load_dataframe(analysis_filename)
 
     black_mistakes = np.array([x if p == 'B' else np.nan for p, x in zip(dataframe['Player'], dataframe['Loss'])])
     worst_black_mistake_indices = np.sort((-black_mistakes).argsort()[:10])
@@ -1,5 +1,6 @@
 # © 2021 Joseph Craig <the.sadakatsu@gmail.com>
 # This code is not released under a standard OSS license.  Please read README.md.
+import copy
 import json
 
 import dateparser
@@ -14,23 +15,43 @@ import katago as kg
 import pandas as pd
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from glob import glob
-
+from threading import Lock
+
+from analysiscache.analysis_checkpoint import AnalysisCheckpoint
+from analysiscache.human_policy_cache import HumanPolicyCache
+from analysiscache.position_key import PositionKey, position_key, rules_key
+from analysiscache.search_cache import SearchCache
+from analysisfile.analysis_archive import (
+    ANALYSIS_EXTENSION,
+    ANALYSIS_VERSION,
+    read_analysis_version,
+    save_game_analysis
+)
+from analysisfile.analysis_catalog import AnalysisCatalog, CatalogEntry, game_hash
+from composeanalysis.assign_priorities import assign_priorities
+from composeanalysis.collect_responses import collect_responses
+from composeanalysis.is_subject_turn import is_subject_turn
 from composeanalysis.compose_analysis import compose_analysis
+from composeanalysis.game_analysis import GameAnalysis
+from composeanalysis.select_deep_turns import select_deep_turns
+from composeanalysis.select_fine_profiles import select_fine_profiles
 from domain.color import Color
 from domain.coordinate import Coordinate
 from domain.game import Game
 from domain.pass_enum import Pass
 from domain.ruleset import Ruleset
 from infographic import generate_infographic
-from katago import Engine, LaunchConfiguration, HumanProfile
+from katago import Engine, EnginePool, LaunchConfiguration, HumanProfile, RemoteEngine
+from katago.query import Query
 from katago.response import SuccessResponse, MoveInfo
 from kifu import print_kifu
-from load_statistics import load_performances_new
+from load_statistics import load_dataframe, load_performances_new
 from parse import parse_sgf_contents, transform_sgf_to_query
 from sklearn.decomposition import PCA
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
-from typing import Callable, Optional, List, Dict, Set, Union, Any
+from typing import Callable, Optional, List, Dict, Set, Tuple, Union, Any
 
 from plot import plot_distributions
 from render import render_table
@@ -40,8 +61,9 @@ MAX_MISTAKE = 361. * 2.
 MIDDLE = MAX_MISTAKE * 4.
 BUCKETS = int(MAX_MISTAKE * 8 + 1)
 
-katago: Optional[Engine] = None
-get_katago: Optional[Callable[[], Engine]] = None
+katago: Optional[Engine | EnginePool | RemoteEngine] = None
+get_katago: Optional[Callable[[], Engine | EnginePool | RemoteEngine]] = None
+katago_lock = Lock()  # games analyzed concurrently must not each launch their own KataGo
 
 
 class ScoringProcedure:
@@ -105,6 +127,19 @@ class ScoringProcedure:
         return result
 
 
+# Everything the quality scores, the summary table and the distribution plots read from an analysis.
+INFOGRAPHIC_COLUMNS = [
+    'Player',
+    'Loss',
+    'Expected Loss',
+    'Posterior Lead',
+    'Played Search',
+    'Best Search',
+    'Counts as Best',
+    'Counts as Match',
+]
+
+
 def run(sgf_filename):
     global katago
 
@@ -114,13 +149,16 @@ def run(sgf_filename):
     procedure = ScoringProcedure(configuration['transformation_parameters'])
     game, black_name, white_name, size, winner = load_sgf(sgf_filename)
     analysis_filename = get_or_create_analysis_file(sgf_filename, configuration, game)
-    original_performances = load_performances_new(analysis_filename)
+
+    # The analysis is read once, and only the columns the infographic needs, for every stage below.
+    dataframe = load_dataframe(analysis_filename, INFOGRAPHIC_COLUMNS)
+    original_performances = load_performances_new(analysis_filename, dataframe)
 
     scored_performances = {
         k1: {k2: procedure.score(v2)[0] for k2, v2 in v1.items()} for k1, v1 in original_performances.items()
     }
 
-    summary = summarize(analysis_filename)
+    summary = summarize(dataframe)
 
     print(f'\nOverall Quality: {scored_performances["Game"]["actual"]:0.3f}')
     print(f'{black_name} (B)\'s Quality: {scored_performances["B"]["actual"]:0.3f}')
@@ -156,7 +194,8 @@ def run(sgf_filename):
         analysis_filename,
         black_name,
         white_name,
-        target_width
+        target_width,
+        dataframe
     )
 
     print('Compiling final infographic...')
@@ -178,7 +217,7 @@ def run(sgf_filename):
 
 def load_configuration():
     def is_bool(x):
-        return x and str(x).lower() in ('true', 'false')
+        return isinstance(x, bool) or str(x).lower() in ('true', 'false')
 
     def is_dict(x):
         return type(x) == dict
@@ -189,6 +228,9 @@ def load_configuration():
     def is_ordinal(x):
         return type(x) == int and x > 0
 
+    def is_positive(x):
+        return type(x) in (int, float) and x > 0
+
     def is_str(x):
         return x and len(str(x).strip()) > 0
 
@@ -198,26 +240,71 @@ def load_configuration():
     test_configuration_value(configuration, 'analyses_directory', os.path.isdir)
     test_configuration_value(configuration, 'brand', os.path.isfile)
     test_configuration_value(configuration, 'buffer', is_ordinal)
+    if 'catalog' in configuration:
+        test_configuration_value(configuration, 'catalog', is_str)
     test_configuration_value(configuration, 'infographics_directory', os.path.isdir)
     test_configuration_value(configuration, 'kifu_directory', os.path.isdir)
     test_configuration_value(configuration, 'plots_directory', os.path.isdir)
     test_configuration_value(configuration, 'renders_directory', os.path.isdir)
     test_configuration_value(configuration, 'threads', is_ordinal)
+    if 'games_in_flight' in configuration:
+        test_configuration_value(configuration, 'games_in_flight', is_ordinal)
+    if 'subject_only' in configuration:
+        test_configuration_value(configuration, 'subject_only', is_bool)
     test_configuration_value(configuration, 'transformation_parameters', os.path.isfile)
 
     test_configuration_value(configuration, 'katago', is_dict)
     katago_entry = configuration['katago']
+    if katago_entry.get('fakeEngine') is not None:
+        # The fake engine never opens KataGo's files, so they need not exist on this machine.
+        test_configuration_value(katago_entry, 'fakeEngine', is_dict)
+        is_katago_file = is_str
+    else:
+        is_katago_file = os.path.isfile
     test_configuration_value(katago_entry, 'analysisThreads', is_ordinal)
-    test_configuration_value(katago_entry, 'config', os.path.isfile)
-    test_configuration_value(katago_entry, 'executable', os.path.isfile)
+    test_configuration_value(katago_entry, 'config', is_katago_file)
+    test_configuration_value(katago_entry, 'executable', is_katago_file)
     test_configuration_value(katago_entry, 'fastQuit', is_bool)
-    test_configuration_value(katago_entry, 'humanModel', os.path.isfile)
+    test_configuration_value(katago_entry, 'humanModel', is_katago_file)
+    if 'instances' in katago_entry:
+        test_configuration_value(katago_entry, 'instances', is_ordinal)
     test_configuration_value(katago_entry, 'playouts', is_ordinal)
     test_configuration_value(katago_entry, 'profile', is_str)
-    test_configuration_value(katago_entry, 'searchModel', os.path.isfile)
+    if 'queryDeadline' in katago_entry:
+        test_configuration_value(katago_entry, 'queryDeadline', is_positive)
+    if 'responseBuffer' in katago_entry:
+        test_configuration_value(katago_entry, 'responseBuffer', is_ordinal)
+    test_configuration_value(katago_entry, 'searchModel', is_katago_file)
     test_configuration_value(katago_entry, 'searchThreads', is_ordinal)
     test_configuration_value(katago_entry, 'visits', is_ordinal)
 
+    if configuration.get('progressive') is not None:
+        test_configuration_value(configuration, 'progressive', is_dict)
+        test_configuration_value(configuration['progressive'], 'report_every', is_positive)
+        test_configuration_value(configuration['progressive'], 'refresh_every', is_positive)
+
+    if configuration.get('cache') is not None:
+        test_configuration_value(configuration, 'cache', is_dict)
+        if 'human_policies' in configuration['cache']:
+            test_configuration_value(configuration['cache'], 'human_policies', is_str)
+        if 'searches' in configuration['cache']:
+            test_configuration_value(configuration['cache'], 'searches', is_str)
+            test_configuration_value(configuration['cache'], 'search_limit', is_ordinal)
+
+    if configuration.get('adaptive') is not None:
+        test_configuration_value(configuration, 'adaptive', is_dict)
+        adaptive_entry = configuration['adaptive']
+        test_configuration_value(adaptive_entry, 'decided_winrate', is_float)
+        test_configuration_value(adaptive_entry, 'favorite_share', is_float)
+        test_configuration_value(adaptive_entry, 'lead_margin', is_positive)
+        test_configuration_value(adaptive_entry, 'shallow_playouts', is_ordinal)
+        test_configuration_value(adaptive_entry, 'winrate_margin', is_float)
+
+    if configuration.get('profile_sampling') is not None:
+        test_configuration_value(configuration, 'profile_sampling', is_dict)
+        test_configuration_value(configuration['profile_sampling'], 'stride', is_ordinal)
+        test_configuration_value(configuration['profile_sampling'], 'threshold', is_float)
+
     test_configuration_value(configuration, 'accuracy', is_dict)
     accuracy_entry = configuration['accuracy']
     test_configuration_value(accuracy_entry, 'lead_drop', is_float)
@@ -242,27 +329,44 @@ def prep_katago(launch_config: LaunchConfiguration):
     def created():
         global katago
 
-        if not katago:
-            print('Starting KataGo...')
-            # katago = KataGo(
-            #     katago_configuration['executable'],
-            #     katago_configuration['configuration'],
-            #     katago_configuration['model'],
-            #     analysis_threads=katago_configuration['analysis_threads'],
-            #     search_threads=katago_configuration['search_threads'],
-            #     max_playouts=katago_configuration['max_playouts'],
-            #     max_visits=katago_configuration['max_visits'],
-            # )
-            katago = Engine(launch_config)
-            while not katago.ready:
-                time.sleep(1)
-            print('KataGo started.')
+        with katago_lock:
+            if not katago:
+                katago = attach_to_daemon(launch_config)
+                if katago:
+                    print(f'Attached to the KataGo daemon at {launch_config.daemon_socket} .')
+                else:
+                    print('Starting KataGo...')
+                    katago = launch_engine(launch_config)
+                    print('KataGo started.')
 
         return katago
 
     get_katago = created
 
 
+def launch_engine(launch_config: LaunchConfiguration) -> Engine | EnginePool:
+    if launch_config.instances > 1:
+        engine = EnginePool(launch_config, launch_config.instances, launch_config.instance_override_config)
+    else:
+        engine = Engine(launch_config)
+    if not engine.wait_until_ready():
+        engine.kill()
+        raise RuntimeError('KataGo exited before it was ready to handle requests.')
+    return engine
+
+
+def attach_to_daemon(launch_config: LaunchConfiguration) -> Optional[RemoteEngine]:
+    socket_path = launch_config.daemon_socket
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+
+    try:
+        return RemoteEngine(socket_path, capacity=launch_config.response_buffer)
+    except OSError as e:
+        print(f'Could not attach to the KataGo daemon at {socket_path} ({e}); starting a local KataGo instead.')
+        return None
+
+
 def load_sgf(sgf):
     print(f'Evaluating {sgf}...')
     with open(sgf, encoding='UTF8') as infile:
@@ -309,122 +413,145 @@ def load_sgf(sgf):
     return corrected, black_name, white_name, size, winner
 
 
-required_headers = {
-    'Move',
-    'Player',
-    'Prior Lead',
-    'Posterior Lead',
-    'Loss',
-    'Prior Win Rate',
-    'Posterior Win Rate',
-    'Drop',
-    'Played',
-    'Played Search',
-    'Best',
-    'Best Search',
-    'Counts as Best',
-    'Counts as Match',
-    'Expected Loss',
-    'Random',
-    '20k',
-    '19k',
-    '18k',
-    '17k',
-    '16k',
-    '15k',
-    '14k',
-    '13k',
-    '12k',
-    '11k',
-    '10k',
-    '9k',
-    '8k',
-    '7k',
-    '6k',
-    '5k',
-    '4k',
-    '3k',
-    '2k',
-    '1k',
-    '1d',
-    '2d',
-    '3d',
-    '4d',
-    '5d',
-    '6d',
-    '7d',
-    '8d',
-    '9d',
-    'Pro',
-    'AI',
-    '20k Policy',
-    '19k Policy',
-    '18k Policy',
-    '17k Policy',
-    '16k Policy',
-    '15k Policy',
-    '14k Policy',
-    '13k Policy',
-    '12k Policy',
-    '11k Policy',
-    '10k Policy',
-    '9k Policy',
-    '8k Policy',
-    '7k Policy',
-    '6k Policy',
-    '5k Policy',
-    '4k Policy',
-    '3k Policy',
-    '2k Policy',
-    '1k Policy',
-    '1d Policy',
-    '2d Policy',
-    '3d Policy',
-    '4d Policy',
-    '5d Policy',
-    '6d Policy',
-    '7d Policy',
-    '8d Policy',
-    '9d Policy',
-    'Pro Policy',
-    'AI Policy',
-    'Search',
-}
-
-
-def get_or_create_analysis_file(sgf_filename, configuration, game):
+def get_or_create_analysis_file(
+    sgf_filename,
+    configuration,
+    game,
+    on_refresh: Optional[Callable[[str], None]] = None,
+    subject: Optional[str] = None
+):
     base_name = get_base_filename(sgf_filename)
 
-    # We can reuse a previously generated analysis if the CSV file exists and it captures the data necessary for this
-    # GPQ version.
-    needs_analysis = True
+    # Analyses are found in the catalog by the content of their game.  One is reused if it is complete, in the format
+    # written by this GPQ version and run with the same settings.  A subject-only analysis is only reused for the same
+    # subject; anything else upgrades it.
     analyses_directory = configuration['analyses_directory']
-    analysis_filename = find_existing_analysis(base_name, analyses_directory)
-    if analysis_filename:
-        print(f'Found {analysis_filename} .')
-        headers = set(pd.read_csv(analysis_filename, index_col=False, nrows=0).columns.to_list())
-
-        needs_analysis = False
-        for required_header in required_headers:
-            if required_header not in headers:
-                print(f'Missing required header "{required_header}".  Rerunning analysis to generate up-to-date file.')
-                needs_analysis = True
-                break
-
-    # Run the analysis only if it is needed.
-    if needs_analysis:
-        analysis_filename = perform_analysis(
-            sgf_filename,
+    reviewed = subject if configuration.get('subject_only') else None
+    settings = get_analysis_settings(configuration)
+    game_key = game_hash(game)
+    catalog = AnalysisCatalog(configuration.get('catalog') or os.path.join(analyses_directory, 'catalog.sqlite'))
+    try:
+        entry = catalog.get(game_key)
+        checkpoint_filename = None
+        if entry is None:
+            entry = adopt_existing_analysis(catalog, game_key, base_name, analyses_directory, settings, reviewed)
+            checkpoint_filename = find_checkpoint(base_name, analyses_directory) if entry is None else None
+        elif os.path.exists(checkpoint_path(entry.filename)):
+            checkpoint_filename = checkpoint_path(entry.filename)
+
+        if entry and not entry.complete:
+            print(f'The analysis for {entry.filename} was interrupted.')
+        elif entry:
+            print(f'Found {entry.filename} .')
+            if entry.version != ANALYSIS_VERSION:
+                print(
+                    f'Found version {entry.version} of the analysis format.  Rerunning analysis to generate up-to-date '
+                    f'file.'
+                )
+            elif {k: v for k, v in entry.settings.items() if k != 'measured_profiles'} != settings:
+                print('The analysis was run with different settings.  Rerunning analysis to generate up-to-date file.')
+            elif entry.subject not in (None, reviewed):
+                print(f'The analysis only covers {entry.subject}.  Rerunning analysis to cover the rest.')
+            elif not os.path.exists(entry.filename):
+                print('The analysis file is missing.  Rerunning analysis to generate it again.')
+            else:
+                return entry.filename
+
+        # Run the analysis.  An interrupted one is resumed from its checkpoint.  The catalog only marks it complete
+        # once its final version is saved.
+        if checkpoint_filename:
+            print(f'Found {checkpoint_filename} ; resuming the interrupted analysis.')
+        if entry:
+            analysis_filename = entry.filename
+        else:
+            analysis_date = get_analysis_date(sgf_filename, game)
+            analysis_filename = build_analysis_filename(analyses_directory, game, base_name, analysis_date)
+        catalog.put(game_key, CatalogEntry(analysis_filename, ANALYSIS_VERSION, settings, reviewed, False))
+        measured_profiles = perform_analysis(
             game,
-            base_name,
-            analyses_directory,
-            configuration
+            analysis_filename,
+            configuration,
+            on_refresh,
+            checkpoint_filename,
+            subject
         )
+        settings = {**settings, 'measured_profiles': [p.value for p in measured_profiles]}
+        catalog.put(game_key, CatalogEntry(analysis_filename, ANALYSIS_VERSION, settings, reviewed, True))
+    finally:
+        catalog.close()
 
     # Return the analysis filename.
     return analysis_filename
 
 
+def get_analysis_settings(configuration: Dict) -> Dict[str, Any]:
+    # Which profiles a sampled analysis ends up measuring depends on the game, so they are recorded once it is done
+    # under 'measured_profiles' rather than being part of what a reused analysis must match.
+    launch_config: Optional[LaunchConfiguration] = configuration.get('katago')
+    return {
+        'adaptive': configuration.get('adaptive'),
+        'human_model': os.path.basename(launch_config.human_model) if launch_config else '',
+        'model': os.path.basename(launch_config.search_model) if launch_config else '',
+        'profile_sampling': configuration.get('profile_sampling'),
+        'profiles': [p.value for p in get_human_profiles()],
+        'visits': launch_config.playouts if launch_config else 0,
+    }
+
+
+def get_human_profiles() -> List[HumanProfile]:
+    # TODO: Do I want to add this to the configuration file in the future?
+    return [
+        p for p in HumanProfile
+        if not (p.value.startswith('preaz') or p.value.startswith('pro') and not p.value.endswith('2023'))
+    ]
+
+
+def adopt_existing_analysis(
+    catalog: AnalysisCatalog,
+    game_key: str,
+    base_name: str,
+    analyses_directory: str,
+    settings: Dict[str, Any],
+    subject: Optional[str]
+) -> Optional[CatalogEntry]:
+    # An analysis written before the catalog existed is found by its filename once and registered.  Its settings were
+    # never recorded, so it is taken to have been run with the current ones.
+    analysis_filename = find_existing_analysis(base_name, analyses_directory, subject)
+    if not analysis_filename or catalog.contains(analysis_filename):
+        return None
+    entry = CatalogEntry(
+        analysis_filename,
+        read_analysis_version(analysis_filename),
+        settings,
+        read_subject_marker(analysis_filename),
+        True
+    )
+    catalog.put(game_key, entry)
+    return entry
+
+
+def analyze_games(sgf_filenames: List[str], configuration: Dict, games_in_flight: int) -> Dict[str, Optional[str]]:
+    # Each game is analyzed on its own thread against the one shared engine, so while a finished game is composed and
+    # saved, the others' queries keep KataGo's analysis threads busy.  Each game is composed as soon as its own responses
+    # are in, whatever order the games finish in.
+    def analyze(sgf_filename: str) -> str:
+        game, *_ = load_sgf(sgf_filename)
+        return get_or_create_analysis_file(sgf_filename, configuration, game)
+
+    analyses: Dict[str, Optional[str]] = {}
+    with ThreadPoolExecutor(max_workers=games_in_flight) as executor:
+        futures = {executor.submit(analyze, sgf_filename): sgf_filename for sgf_filename in sgf_filenames}
+        for future in as_completed(futures):
+            sgf_filename = futures[future]
+            try:
+                analyses[sgf_filename] = future.result()
+                print(f'Finished {sgf_filename} ({len(analyses)} / {len(futures)}).')
+            except BaseException as e:
+                analyses[sgf_filename] = None
+                print(f'Could not analyze {sgf_filename}: {e!r}')
+    return analyses
+
+
 def get_base_filename(file):
     filename = os.path.basename(file)
     index = filename.rfind('.')
@@ -433,56 +560,348 @@ def get_base_filename(file):
     return re.sub(r'[^\w.-]+', '_', filename)
 
 
-def find_existing_analysis(base_name, analyses_directory):
+def find_existing_analysis(base_name, analyses_directory, subject: Optional[str] = None):
+    if not analyses_directory.endswith('/'):
+        analyses_directory += '/'
+    needle = f'{analyses_directory}*_{base_name}{ANALYSIS_EXTENSION}'
+    haystack = [
+        x for x in glob(needle)
+        if not os.path.exists(progress_marker(x)) and read_subject_marker(x) in (None, subject)
+    ]
+    return haystack[0] if haystack else None
+
+
+def find_checkpoint(base_name, analyses_directory):
     if not analyses_directory.endswith('/'):
         analyses_directory += '/'
-    needle = f'{analyses_directory}*_{base_name}.csv'
-    haystack = [x for x in glob(needle)]
+    haystack = glob(checkpoint_path(f'{analyses_directory}*_{base_name}{ANALYSIS_EXTENSION}'))
     return haystack[0] if haystack else None
 
 
+def checkpoint_path(analysis_filename: str) -> str:
+    return analysis_filename + '.checkpoint'
+
+
+def subject_marker(analysis_filename: str) -> str:
+    # A subject-only analysis names its subject in this marker.  Its checkpoint is kept, so that upgrading it to a full
+    # analysis only queries what the subject did not need.
+    return analysis_filename + '.subject'
+
+
+def read_subject_marker(analysis_filename: str) -> Optional[str]:
+    if not os.path.exists(subject_marker(analysis_filename)):
+        return None
+    with open(subject_marker(analysis_filename), 'r', encoding='utf-8') as infile:
+        return infile.read().strip()
+
+
+def progress_marker(analysis_filename: str) -> str:
+    # A provisional analysis keeps this marker beside it until the full search budget has been spent, so that an
+    # interrupted progressive run is never mistaken for a finished analysis.
+    return analysis_filename + '.progress'
+
+
 def perform_analysis(
-    sgf_filename,
     game,
-    base_name,
-    analyses_directory,
-    configuration: Dict
-):
+    analysis_filename,
+    configuration: Dict,
+    on_refresh: Optional[Callable[[str], None]] = None,
+    checkpoint_filename: Optional[str] = None,
+    subject: Optional[str] = None
+) -> List[HumanProfile]:
     global katago
 
-    analysis_date = get_analysis_date(sgf_filename, game)
-    analysis_filename = build_analysis_filename(analyses_directory, game, base_name, analysis_date)
     query, initial_player, positions = transform_sgf_to_query(game)
     query.include_ownership = True
 
+    progressive: Optional[Dict] = configuration.get('progressive')
+    if progressive:
+        query.report_during_search_every = progressive['report_every']
+
     katago = get_katago()
     print('Sending game for analysis...')
 
     # We need to publish a deep query for the analysis and incredibly shallow queries to get the human policy values.
-    # We need to track each of these
+    # They are published as one batch so that all of their responses flow through a single bounded handle.
     start = time.time()
-    query_ids: Dict[Optional[HumanProfile], str] = {}
-    query_ids[None] = katago.write_query(query)
-
-    query.include_ownership = False
-    query.max_visits = 1
-    query.analyze_turns.pop()  # we don't need the last turn analyzed because there is no following turn to score
-    for human_profile in HumanProfile:
-        # TODO: Do I want to add this to the configuration file in the future?
-        name = human_profile.value
-        if name.startswith('preaz') or name.startswith('pro') and not name.endswith('2023'):
-            continue
-        query.set_human_profile(human_profile)
-        query_ids[human_profile] = katago.write_query(query)
+    queries: Dict[Optional[HumanProfile], Query] = {}
+
+    profile_query = copy.deepcopy(query)
+    profile_query.include_ownership = False
+    profile_query.max_visits = 1
+    profile_query.report_during_search_every = None  # a single visit has nothing to report along the way
+    profile_query.analyze_turns.pop()  # we don't need the last turn analyzed because there is no following turn to score
+
+    # A subject-only analysis measures human profiles on the subject's turns alone, and in adaptive mode only spends the
+    # full search on the subject's moves.
+    reviewed = subject if configuration.get('subject_only') else None
+    if reviewed:
+        profile_query.analyze_turns = [
+            turn for turn in profile_query.analyze_turns if is_subject_turn(query.moves, reviewed, turn)
+        ]
+        print(f'Analyzing for {reviewed} only.')
+
+    # Positions recur across games, so searches and human policies are cached by position.  Only the turns missing from
+    # the caches are sent to KataGo.
+    launch_config: Optional[LaunchConfiguration] = configuration.get('katago')
+    human_policy_cache, search_cache, keys = open_caches(configuration, game, positions)
+    rules = rules_key(query.rules)
+    komi = float(query.komi)
+    size = int(game[0]['SZ'] if 'SZ' in game[0] else 19)
+    model = os.path.basename(launch_config.search_model) if launch_config else ''
+    visits = query.max_visits or (launch_config.playouts if launch_config else 0)
+
+    # Every final response is also checkpointed, so that an interrupted analysis only has to query what it never got.
+    adaptive: Optional[Dict] = configuration.get('adaptive')
+    checkpoint = AnalysisCheckpoint(
+        checkpoint_filename or checkpoint_path(analysis_filename),
+        json.dumps({'adaptive': adaptive, 'model': model, 'visits': visits})
+    )
+    cached_searches: List[SuccessResponse] = checkpoint.searches()
+    cached_policies: Dict[int, Dict[HumanProfile, np.ndarray]] = {
+        turn: {profile: policy.astype(np.float32) for profile, policy in profiles.items()}
+        for turn, profiles in checkpoint.human_policies().items()
+    }
+    if cached_searches or cached_policies:
+        print(
+            f'{len(cached_searches)} searches and {sum(len(p) for p in cached_policies.values())} human policies were '
+            f'recovered from {checkpoint.filename} .'
+        )
+    checkpointed_turns = {r.turn_number for r in cached_searches}
+    query.analyze_turns = [turn for turn in query.analyze_turns if turn not in checkpointed_turns]
+
+    if search_cache:
+        uncached_turns = []
+        for turn in query.analyze_turns:
+            response = search_cache.get(keys[turn], rules, komi, model, visits, turn)
+            if response is None:
+                uncached_turns.append(turn)
+            else:
+                cached_searches.append(response)
+        query.analyze_turns = uncached_turns
+        print(f'{search_cache.hits} searches were found in {search_cache.filename}; {search_cache.misses} must be run.')
+
+    # In adaptive mode, a shallow search of every position comes first.  The full budget then goes only to the positions
+    # around moves whose scoring the shallow search leaves uncertain.
+    # When a subject is being reviewed, KataGo is asked to finish the turns their review depends on first.
+    if query.analyze_turns:
+        assign_priorities(query, subject, True)
+        if adaptive:
+            shallow_query = copy.deepcopy(query)
+            shallow_query.max_visits = adaptive['shallow_playouts']
+            shallow_query.report_during_search_every = None
+            queries[None] = shallow_query
+        else:
+            queries[None] = query
+
+    human_profiles = get_human_profiles()
+
+    def add_profile_queries(
+        batch: Dict[Optional[HumanProfile], Query],
+        sampled_profiles: List[HumanProfile],
+        turns: List[int]
+    ):
+        for human_profile in sampled_profiles:
+            uncached_turns = [turn for turn in turns if human_profile not in cached_policies.get(turn, {})]
+            if human_policy_cache:
+                candidates, uncached_turns = uncached_turns, []
+                for turn in candidates:
+                    policy = human_policy_cache.get(keys[turn], rules, komi, human_profile)
+                    if policy is None:
+                        uncached_turns.append(turn)
+                    else:
+                        cached_policies.setdefault(turn, {})[human_profile] = policy.astype(np.float32)
+            if not uncached_turns:
+                continue
+
+            batch[human_profile] = copy.deepcopy(profile_query)
+            batch[human_profile].analyze_turns = list(uncached_turns)
+            batch[human_profile].set_human_profile(human_profile)
+            assign_priorities(batch[human_profile], subject, False)
+
+    # When sampling profiles, a sparse ladder of them is measured first.  The ranks between them are measured only for
+    # a player whose posterior puts weight nearby; the rest are interpolated when the analysis is composed.
+    sampling: Optional[Dict] = configuration.get('profile_sampling')
+    coarse_profiles = human_profiles[::sampling['stride']] if sampling else human_profiles
+    if coarse_profiles[-1] != human_profiles[-1]:
+        coarse_profiles.append(human_profiles[-1])
+    coarse_queries: Dict[Optional[HumanProfile], Query] = {}
+    measured_profiles: List[HumanProfile] = list(coarse_profiles)
+    add_profile_queries(coarse_queries if sampling else queries, coarse_profiles, profile_query.analyze_turns)
+
+    if human_policy_cache:
+        print(
+            f'{human_policy_cache.hits} human policies were found in {human_policy_cache.filename}; '
+            f'{human_policy_cache.misses} must be evaluated.'
+        )
 
-    analysis = compose_analysis(katago, positions, start, game, configuration, query_ids)
+    def remember_policy(turn: int, human_profile: HumanProfile, policy: np.ndarray):
+        checkpoint.put_human_policy(turn, human_profile, policy)
+        if human_policy_cache:
+            human_policy_cache.put(keys[turn], rules, komi, human_profile, policy)
+
+    def remember_search(response: SuccessResponse):
+        checkpoint.put_search(response)
+        if search_cache:
+            search_cache.put(keys[response.turn_number], rules, komi, model, visits, response)
+
+    deadline = launch_config.query_deadline if launch_config else None
+    if sampling:
+        print(f'Measuring {len(coarse_profiles)} of {len(human_profiles)} human profiles first...')
+        handle = katago.submit_batch(list(coarse_queries.values()), deadline=deadline)
+        query_ids: Dict[Optional[HumanProfile], str] = {profile: q.id for profile, q in coarse_queries.items()}
+        try:
+            _, cached_policies = collect_responses(
+                handle,
+                query_ids,
+                positions,
+                start,
+                cached_policies=cached_policies,
+                on_human_policy=remember_policy
+            )
+        except BaseException:
+            katago.cancel(handle.id)
+            raise
+
+        fine_turns = select_fine_profiles(
+            cached_policies,
+            query.moves,
+            size,
+            human_profiles,
+            coarse_profiles,
+            sampling['threshold']
+        )
+        for human_profile, turns in fine_turns.items():
+            add_profile_queries(queries, [human_profile], turns)
+        measured_profiles = [p for p in human_profiles if p in coarse_profiles or p in fine_turns]
+        print(f'{len(fine_turns)} more human profiles are needed near the players\' likely ranks.')
+
+    handle = katago.submit_batch(list(queries.values()), deadline=deadline)
+    query_ids = {profile: q.id for profile, q in queries.items()}
+
+    def refresh(provisional: GameAnalysis):
+        with open(progress_marker(analysis_filename), 'w', encoding='utf-8'):
+            pass
+        save_analysis(analysis_filename, provisional)
+        if on_refresh is not None:
+            on_refresh(analysis_filename)
+
+    try:
+        if adaptive and None in queries:
+            print('Running shallow searches to find the positions that need the full search...')
+            searches, cached_policies = collect_responses(
+                handle,
+                query_ids,
+                positions,
+                start,
+                cached_policies=cached_policies,
+                on_human_policy=remember_policy,
+                cached_searches=cached_searches
+            )
+            deep_turns = select_deep_turns(searches, cached_policies, positions, size, game, configuration, reviewed)
+            deep_turns -= {r.turn_number for r in cached_searches}
+            print(f'{len(deep_turns)} of {positions} positions need the full search.')
+
+            cached_searches = [r for r in searches if r.turn_number not in deep_turns]
+            # The opponent's moves may still need the full search when this analysis is upgraded, so a subject-only
+            # analysis does not checkpoint the shallow searches it keeps.
+            for response in cached_searches:
+                if response.turn_number not in checkpointed_turns and not reviewed:
+                    checkpoint.put_search(response)
+            query.analyze_turns = sorted(deep_turns)
+            assign_priorities(query, subject, True)
+            queries = {None: query} if deep_turns else {}
+            handle = katago.submit_batch(list(queries.values()), deadline=deadline)
+            query_ids = {profile: q.id for profile, q in queries.items()}
+
+        analysis = compose_analysis(
+            handle,
+            positions,
+            start,
+            game,
+            configuration,
+            query_ids,
+            refresh if progressive else None,
+            progressive['refresh_every'] if progressive else None,
+            cached_policies,
+            remember_policy,
+            cached_searches,
+            remember_search,
+            human_profiles if sampling else None
+        )
+    except BaseException:
+        # Do not leave KataGo (or a shared daemon) grinding through a game nobody is waiting for anymore.
+        katago.cancel(handle.id)
+        raise
+    finally:
+        # Whatever KataGo answered before a failure is still worth keeping.
+        checkpoint.close()
+        if human_policy_cache:
+            human_policy_cache.close()
+        if search_cache:
+            search_cache.close()
     elapsed = time.time() - start
     print(
         f'Game reviewed in {elapsed:0.3f} seconds.'
     )
 
+    metrics = katago.metrics
+    print(
+        f'KataGo averaged {metrics.positions_per_second:0.3f} positions and {metrics.visits_per_second:0.1f} visits per '
+        f'second; decoding its {metrics.bytes_read} bytes of output took {metrics.decode_seconds:0.3f} seconds.'
+    )
+    if metrics.restarts:
+        print(f'KataGo crashed and was restarted {metrics.restarts} times, losing {metrics.lost_seconds:0.1f} seconds.')
+    if launch_config and launch_config.metrics_file:
+        metrics.dump(launch_config.metrics_file)
+        print(f'Engine metrics written to {launch_config.metrics_file} .')
+
+    # The subject marker goes down before the analysis, so that a partial analysis can never pass for a full one.
+    if reviewed:
+        with open(subject_marker(analysis_filename), 'w', encoding='utf-8') as outfile:
+            outfile.write(reviewed)
     save_analysis(analysis_filename, analysis)
-    return analysis_filename
+    if not reviewed:
+        if os.path.exists(subject_marker(analysis_filename)):
+            os.remove(subject_marker(analysis_filename))
+        for suffix in ('', '-shm', '-wal'):
+            if os.path.exists(checkpoint.filename + suffix):
+                os.remove(checkpoint.filename + suffix)
+    if os.path.exists(progress_marker(analysis_filename)):
+        os.remove(progress_marker(analysis_filename))
+    return measured_profiles
+
+
+def open_caches(
+    configuration: Dict,
+    game: List[Dict],
+    positions: int
+) -> Tuple[Optional[HumanPolicyCache], Optional[SearchCache], Optional[List[PositionKey]]]:
+    cache_entry = configuration.get('cache') or {}
+    if not (cache_entry.get('human_policies') or cache_entry.get('searches')):
+        return None, None, None
+
+    # The domain model only plays 19x19 boards.  If it cannot replay the game exactly as KataGo will see it, the caches
+    # sit this game out rather than risk mixing up positions.
+    root = game[0]
+    if int(root['SZ'] if 'SZ' in root else 19) != 19:
+        return None, None, None
+    try:
+        states = play_through_sgf(game)
+    except Exception as e:
+        print(f'Could not replay the game to look up cached evaluations: {e}')
+        return None, None, None
+    if len(states) != positions:
+        print('The replayed game does not match the positions sent to KataGo; its evaluations will not be cached.')
+        return None, None, None
+
+    human_policy_cache = None
+    if cache_entry.get('human_policies'):
+        human_policy_cache = HumanPolicyCache(cache_entry['human_policies'])
+    search_cache = None
+    if cache_entry.get('searches'):
+        search_cache = SearchCache(cache_entry['searches'], cache_entry['search_limit'])
+    return human_policy_cache, search_cache, [position_key(state) for state in states]
 
 
 def get_analysis_date(sgf_filename, main_variation):
@@ -535,7 +954,7 @@ def build_analysis_filename(analyses_directory, game, base_name, analysis_date):
     path += f'vs-{black_name}'
     if black_rank:
         path += f'-{black_rank}'
-    path += f'__{base_name}.csv'
+    path += f'__{base_name}{ANALYSIS_EXTENSION}'
     path = re.sub(r'[^\w.\- ]+', '_', path)
 
     print('DEBUG: path is', path)
@@ -1010,114 +1429,14 @@ def get_handicap_stones(root: dict) -> Set[Coordinate]:
     return handicap_stones
 
 
-def save_analysis(analysis_filename: str, analysis: List[Dict]):
+def save_analysis(analysis_filename: str, analysis: GameAnalysis):
     print(f'Writing analysis to {analysis_filename}...')
-
-    with open(analysis_filename, 'w', encoding='utf-8') as csvfile:
-        csvfile.write(
-            'Move,Player,Prior Lead,Posterior Lead,Loss,Prior Win Rate,Posterior Win Rate,Drop,Played,Played Search,'
-            'Best,Best Search,Counts as Best,Counts as Match,Expected Loss,Random,20k,19k,18k,17k,16k,15k,14k,13k,'
-            '12k,11k,10k,9k,8k,7k,6k,5k,4k,3k,2k,1k,1d,2d,3d,4d,5d,6d,7d,8d,9d,Pro,AI,20k Policy,19k Policy,18k Policy,'
-            '17k Policy,16k Policy,15k Policy,14k Policy,13k Policy,12k Policy,11k Policy,10k Policy,9k Policy,'
-            '8k Policy,7k Policy,6k Policy,5k Policy,4k Policy,3k Policy,2k Policy,1k Policy,1d Policy,2d Policy,'
-            '3d Policy,4d Policy,5d Policy,6d Policy,7d Policy,8d Policy,9d Policy,Pro Policy,AI Policy,Search\n'
-        )
-
-        for entry in analysis:
-            columns = [
-                str(entry['move']),
-                entry['player'],
-                str(entry['prior lead']),
-                str(entry['posterior lead']),
-                str(entry['loss']),
-                str(entry['prior win rate']),
-                str(entry['posterior win rate']),
-                str(entry['drop']),
-                str(entry['played']),
-                str(entry['played search']),
-                str(entry['best']),
-                str(entry['best search']),
-                str(entry['counts as best']),
-                str(entry['counts as match']),
-                str(entry['expected loss']),
-                str(entry['priors']['random']),
-                str(entry['priors']['20k']),
-                str(entry['priors']['19k']),
-                str(entry['priors']['18k']),
-                str(entry['priors']['17k']),
-                str(entry['priors']['16k']),
-                str(entry['priors']['15k']),
-                str(entry['priors']['14k']),
-                str(entry['priors']['13k']),
-                str(entry['priors']['12k']),
-                str(entry['priors']['11k']),
-                str(entry['priors']['10k']),
-                str(entry['priors']['9k']),
-                str(entry['priors']['8k']),
-                str(entry['priors']['7k']),
-                str(entry['priors']['6k']),
-                str(entry['priors']['5k']),
-                str(entry['priors']['4k']),
-                str(entry['priors']['3k']),
-                str(entry['priors']['2k']),
-                str(entry['priors']['1k']),
-                str(entry['priors']['1d']),
-                str(entry['priors']['2d']),
-                str(entry['priors']['3d']),
-                str(entry['priors']['4d']),
-                str(entry['priors']['5d']),
-                str(entry['priors']['6d']),
-                str(entry['priors']['7d']),
-                str(entry['priors']['8d']),
-                str(entry['priors']['9d']),
-                str(entry['priors']['pro']),
-                str(entry['priors']['AI']),
-                csv_escape_json(entry['policies']['20k']),
-                csv_escape_json(entry['policies']['19k']),
-                csv_escape_json(entry['policies']['18k']),
-                csv_escape_json(entry['policies']['17k']),
-                csv_escape_json(entry['policies']['16k']),
-                csv_escape_json(entry['policies']['15k']),
-                csv_escape_json(entry['policies']['14k']),
-                csv_escape_json(entry['policies']['13k']),
-                csv_escape_json(entry['policies']['12k']),
-                csv_escape_json(entry['policies']['11k']),
-                csv_escape_json(entry['policies']['10k']),
-                csv_escape_json(entry['policies']['9k']),
-                csv_escape_json(entry['policies']['8k']),
-                csv_escape_json(entry['policies']['7k']),
-                csv_escape_json(entry['policies']['6k']),
-                csv_escape_json(entry['policies']['5k']),
-                csv_escape_json(entry['policies']['4k']),
-                csv_escape_json(entry['policies']['3k']),
-                csv_escape_json(entry['policies']['2k']),
-                csv_escape_json(entry['policies']['1k']),
-                csv_escape_json(entry['policies']['1d']),
-                csv_escape_json(entry['policies']['2d']),
-                csv_escape_json(entry['policies']['3d']),
-                csv_escape_json(entry['policies']['4d']),
-                csv_escape_json(entry['policies']['5d']),
-                csv_escape_json(entry['policies']['6d']),
-                csv_escape_json(entry['policies']['7d']),
-                csv_escape_json(entry['policies']['8d']),
-                csv_escape_json(entry['policies']['9d']),
-                csv_escape_json(entry['policies']['pro']),
-                csv_escape_json(entry['policies']['AI']),
-                csv_escape_json(entry['search']),
-            ]
-
-            csvfile.write(','.join(columns) + '\n')
-
+    save_game_analysis(analysis_filename, analysis)
     print('Analysis saved.')
 
 
-def csv_escape_json(raw: Any) -> str:
-    return f'''"{json.dumps(raw).replace('"', '""')}"'''
-
-
-def summarize(analysis_filename: str) -> dict:
-    dataframe = pd.read_csv(analysis_filename)
-    dataframe['Search'] = dataframe[['Played Search', 'Best Search']].min(axis=1)
+def summarize(dataframe: pd.DataFrame) -> dict:
+    dataframe = dataframe.assign(Search=dataframe[['Played Search', 'Best Search']].min(axis=1))
 
     statistics = dict()
     for key in ('B', 'W'):
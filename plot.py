@@ -1,16 +1,23 @@
 # © 2021 Joseph Craig <the.sadakatsu@gmail.com>
 # This code is not released under a standard OSS license.  Please read README.md.
-from typing import Tuple
+from typing import Optional, Tuple
 
 import matplotlib.font_manager
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
 from fontTools.ttLib import TTFont
 from matplotlib.ticker import MultipleLocator
 
 from common import get_filename_core, ImageData
-from load_statistics import get_expected_result, load_performances, get_worst_moves, load_performances_new
+from load_statistics import (
+    get_expected_result,
+    load_dataframe,
+    load_performances,
+    get_worst_moves,
+    load_performances_new
+)
 from matplotlib import rcParams
 
 from kde import generate_density_estimation
@@ -22,10 +29,13 @@ def plot_distributions(
     analysis_filename: str,
     black_name: str,
     white_name: str,
-    target_width: int
+    target_width: int,
+    dataframe: Optional[pd.DataFrame] = None
 ) -> Tuple[ImageData, ImageData]:
     # TODO: Refactor this code into two branches: one for KDE, one for expected result.
     _set_matplotlib_fonts(analysis_filename)
+    if dataframe is None:
+        dataframe = load_dataframe(analysis_filename)
 
     filename_core = get_filename_core(analysis_filename)
     distribution_filename = f'{plots_directory}/{filename_core}__kde.png'
@@ -36,7 +46,7 @@ def plot_distributions(
     size = (width, height)
 
     # performances = load_performances(analysis_filename, use_rounded=False)
-    performances = load_performances_new(analysis_filename)
+    performances = load_performances_new(analysis_filename, dataframe)
     minimum = _get_safe_minimum(performances) - 5
     maximum = _get_safe_maximum(performances) + 5
 
@@ -88,10 +98,10 @@ def plot_distributions(
     figure.set_size_inches(width / 100, height / 100)
     plt.savefig(distribution_filename, format='png', dpi=100)
 
-    expected_result = get_expected_result(analysis_filename)
+    expected_result = get_expected_result(analysis_filename, dataframe)
     move_count = len(expected_result)
     move_indices = [i + 1 for i in range(move_count)]
-    mistake_indices, worst_mistakes = get_worst_moves(analysis_filename)
+    mistake_indices, worst_mistakes = get_worst_moves(analysis_filename, dataframe)
     mistake_ceiling = int(np.ceil(np.max(np.abs(worst_mistakes)) + 1))
 
     plt.close('all')
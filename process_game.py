@@ -2,12 +2,11 @@ import os
 import re
 import sys
 from collections import OrderedDict, Counter
-from typing import Any
 
 import jsons
 import numpy as np
-import pandas as pd
 
+from analysisfile.analysis_archive import load_game_analysis
 from damage import calculate_damage
 from domain.coordinate import Coordinate
 from domain.game import Game
@@ -17,11 +16,6 @@ from go_study import ratings, _1d, Statistics
 from main import load_configuration, ScoringProcedure, get_or_create_analysis_file, load_sgf, prep_katago, get_komi
 
 
-def translate_json_field(raw: str) -> Any:
-    unescaped = raw.replace('""', '"')
-    return jsons.loads(unescaped)
-
-
 def calculate_expected_loss(row):
     # This is how the calculation should work in the GPQ analysis core itself.  I will fix it soon.
     search = row['Parsed']
@@ -114,8 +108,9 @@ def run(sgf_filename: str):
 
     analysis_filename = get_or_create_analysis_file(sgf_filename, configuration, game)
 
-    df = pd.read_csv(analysis_filename)
-    df['Parsed'] = df.apply(lambda row: translate_json_field(row['Search']), axis=1)
+    analysis = load_game_analysis(analysis_filename)
+    df = analysis.frame()
+    df['Parsed'] = [analysis.search(i) for i in range(len(analysis))]
     df['Corrected Expected Loss'] = df.apply(calculate_expected_loss, axis=1)
 
     breakdowns = OrderedDict()